@@ -0,0 +1,434 @@
+"""
+Replay recorded screenshots through a fake device and measure the hot loop.
+
+Recorded frames can be any folder of 720x1280 PNG screenshots,
+such as the ones saved by NikkeAutoScript.save_error_log() in ./log/error/<timestamp>.
+No emulator or adb is needed, it runs headless.
+
+Examples:
+    python -m dev_tools.benchmark --frames ./log/error/1700000000000
+    python -m dev_tools.benchmark --frames ./frames --task Reward --task Mailbox --save ./bench.json
+    python -m dev_tools.benchmark --frames ./frames --baseline ./bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from functools import cached_property, wraps
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from module.base.timer import Timer
+from module.base.utils import load_image, image_size
+from module.config.config import NikkeConfig
+from module.device.device import Device
+from module.logger import logger
+
+
+class ReplayEnd(Exception):
+    """Raised when the screenshot budget of a benchmark is used up."""
+    pass
+
+
+class BenchmarkConfig(NikkeConfig):
+    @staticmethod
+    def write_file(config_name, data, mod_name='nkas'):
+        # Never write user configs during benchmark
+        pass
+
+
+class LatencyRecorder:
+    def __init__(self):
+        # label -> list of seconds
+        self.records = defaultdict(list)
+        self._patched = []
+
+    def add(self, label, cost):
+        self.records[label].append(cost)
+
+    def patch(self, owner, name, label=None):
+        """
+        Replace owner.name with a wrapper that records the time cost of each call.
+
+        Args:
+            owner: Class or instance.
+            name (str): Method name.
+            label (str): Defaults to Owner.name
+        """
+        if label is None:
+            label = f'{owner.__name__ if isinstance(owner, type) else type(owner).__name__}.{name}'
+        func = getattr(owner, name)
+        recorder = self
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.add(label, time.perf_counter() - start)
+
+        self._patched.append((owner, name, owner.__dict__.get(name) if isinstance(owner, type) else None))
+        setattr(owner, name, wrapper)
+
+    def unpatch(self):
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patched.clear()
+
+    def report(self):
+        """
+        Returns:
+            dict: label -> {count, mean, p50, p95, p99} in milliseconds.
+        """
+        result = {}
+        for label, costs in self.records.items():
+            costs = np.array(costs) * 1000
+            result[label] = {
+                'count': int(costs.size),
+                'mean': round(float(np.mean(costs)), 3),
+                'p50': round(float(np.percentile(costs, 50)), 3),
+                'p95': round(float(np.percentile(costs, 95)), 3),
+                'p99': round(float(np.percentile(costs, 99)), 3),
+            }
+        return result
+
+
+class ReplayDevice(Device):
+    def __init__(self, config, frames):
+        """
+        A Device without adb connection, screenshots come from recorded frames in order
+        and controls are only recorded.
+
+        Args:
+            config (NikkeConfig):
+            frames (list[np.ndarray]):
+        """
+        # Skip Connection.__init__(), which connects to adb
+        self.config = config
+        self.serial = 'replay'
+        self.package = self.config.Emulator_PackageName.replace('_', '.')
+        self.config.override(Emulator_ScreenshotMethod='Replay', Emulator_ScreenshotInterval=0,
+                             Emulator_ScreenshotAdaptive=False, Emulator_ScreenshotPrefetch=False)
+        self._screenshot_pacer = None
+        self._screenshot_interval = Timer(0)
+        self.frames = frames
+        self.frame_index = 0
+        self.screenshot_budget = None
+        self.control_history = []
+        self.image = None
+
+    @cached_property
+    def screenshot_methods(self):
+        return {'Replay': self.screenshot_replay}
+
+    @cached_property
+    def click_methods(self):
+        return {
+            'minitouch': self.click_replay,
+            'ADB': self.click_replay,
+        }
+
+    def screenshot_replay(self):
+        if self.screenshot_budget is not None:
+            if self.screenshot_budget <= 0:
+                raise ReplayEnd
+            self.screenshot_budget -= 1
+        image = self.frames[self.frame_index % len(self.frames)]
+        self.frame_index += 1
+        # Screenshots are new arrays in real devices
+        return image.copy()
+
+    def click_replay(self, x, y):
+        self.control_history.append(('click', x, y))
+
+    def click_coordinate(self, x, y=None):
+        if y is None:
+            x, y = x[0], x[1]
+        self.click_replay(x, y)
+        self.control_timestamp = time.time()
+
+    def swipe_coordinate(self, p1, p2):
+        self.control_history.append(('swipe', p1, p2))
+        self.control_timestamp = time.time()
+
+    def swipe(self, p1, p2, name='SWIPE', label='Swipe', distance_check=True, handle_control_check=True):
+        self.swipe_coordinate(p1, p2)
+
+    def drag_minitouch(self, p1, p2):
+        self.swipe_coordinate(p1, p2)
+
+    def app_is_running(self):
+        return True
+
+    def app_start(self):
+        self.stuck_record_clear()
+        self.click_record_clear()
+
+    def app_stop(self):
+        self.stuck_record_clear()
+        self.click_record_clear()
+
+    def get_orientation(self):
+        return 0
+
+    @staticmethod
+    def sleep(second):
+        # Benchmarks measure CPU time between clicks, don't wait
+        pass
+
+
+def load_frames(folder):
+    """
+    Args:
+        folder (str):
+
+    Returns:
+        list[np.ndarray]: 720x1280 screenshots sorted by filename.
+    """
+    frames = []
+    for file in sorted(os.listdir(folder)):
+        if os.path.splitext(file)[1].lower() not in ['.png', '.jpg', '.bmp']:
+            continue
+        image = load_image(os.path.join(folder, file))
+        if image_size(image) != (720, 1280):
+            logger.warning(f'Skip {file}, size {image_size(image)} is not 720x1280')
+            continue
+        frames.append(image)
+    logger.info(f'Loaded {len(frames)} frames from {folder}')
+    return frames
+
+
+class Benchmark:
+    def __init__(self, frames, config_name='template', budget=50):
+        """
+        Args:
+            frames (list[np.ndarray]):
+            config_name (str):
+            budget (int): Maximum screenshots of each UI detection or task run.
+        """
+        self.config = BenchmarkConfig(config_name)
+        self.device = ReplayDevice(self.config, frames)
+        self.device.disable_stuck_detection()
+        self.budget = budget
+        self.recorder = LatencyRecorder()
+        # Names of benchmarks skipped
+        self.skipped = []
+
+    def ocr_unavailable(self, tasks=()):
+        """
+        Args:
+            tasks (list[str]): Tasks to run, models of all tasks are always checked.
+
+        Returns:
+            str: Reason if OCR models used by tasks can't be loaded, such as cnocr not installed.
+                None if available.
+        """
+        from module.ocr.models import OCR_MODEL
+        for name in OCR_MODEL.task_models(tasks):
+            try:
+                OCR_MODEL.get(name)
+            except Exception as e:
+                return f'{name}, {type(e).__name__}: {e}'
+        return None
+
+    def skip(self, name, reason):
+        logger.warning(f'Skip {name} benchmark, OCR models unavailable: {reason}')
+        self.skipped.append(name)
+
+    def run_screenshot(self):
+        logger.hr('Benchmark screenshot', level=1)
+        self.recorder.patch(self.device, 'screenshot', label='Screenshot.screenshot')
+        try:
+            for _ in range(len(self.device.frames)):
+                self.device.screenshot()
+        finally:
+            self.recorder.unpatch()
+
+    def run_button(self):
+        logger.hr('Benchmark button', level=1)
+        # Import assets to register buttons
+        import module.handler.assets
+        import module.ui.assets
+        from module.base.button import Button
+        from module.base.resource import Resource
+        buttons = [b for b in Resource.instances.values() if isinstance(b, Button) and not b.is_gif]
+
+        self.recorder.patch(Button, 'match')
+        self.recorder.patch(Button, 'appear_on')
+        try:
+            for _ in range(len(self.device.frames)):
+                image = self.device.screenshot()
+                for button in buttons:
+                    button.match(image, offset=(30, 30), threshold=self.config.BUTTON_MATCH_SIMILARITY)
+                    button.appear_on(image, threshold=self.config.COLOR_SIMILAR_THRESHOLD)
+        finally:
+            self.recorder.unpatch()
+
+    def run_ocr(self):
+        logger.hr('Benchmark OCR', level=1)
+        reason = self.ocr_unavailable()
+        if reason:
+            self.skip('OCR', reason)
+            return
+        from module.ocr.ocr import Ocr
+        # Title bar and a digit area, typical single line OCR
+        ocr = Ocr([(0, 0, 720, 60), (446, 660, 505, 692)], lang='cnocr', name='BENCHMARK')
+
+        self.recorder.patch(Ocr, 'ocr')
+        try:
+            for _ in range(len(self.device.frames)):
+                image = self.device.screenshot()
+                ocr.ocr(image)
+        finally:
+            self.recorder.unpatch()
+
+    def run_ui(self):
+        logger.hr('Benchmark UI', level=1)
+        # Popups such as announcements are detected by OCR
+        reason = self.ocr_unavailable()
+        if reason:
+            self.skip('UI', reason)
+            return
+        from module.exception import GamePageUnknownError
+        from module.ui.ui import UI
+        ui = UI(self.config, device=self.device)
+        self.recorder.patch(UI, 'ui_get_current_page')
+        try:
+            for _ in range(len(self.device.frames)):
+                self.device.screenshot()
+                self.device.screenshot_budget = self.budget
+                try:
+                    ui.ui_get_current_page(skip_first_screenshot=True)
+                except (ReplayEnd, GamePageUnknownError):
+                    pass
+                finally:
+                    self.device.screenshot_budget = None
+        finally:
+            self.recorder.unpatch()
+
+    def run_task(self, task):
+        """
+        Run a task like the scheduler does, until it ends or the screenshot budget is used up.
+        Interval between two screenshots is recorded as the loop latency.
+
+        Args:
+            task (str): Such as `Reward`
+        """
+        logger.hr(f'Benchmark task {task}', level=1)
+        reason = self.ocr_unavailable([task])
+        if reason:
+            self.skip(f'task {task}', reason)
+            return
+        import inflection
+        from main import NikkeAutoScript
+        from module.config.config import TaskEnd, name_to_function
+
+        nkas = NikkeAutoScript(config_name=self.config.config_name)
+        nkas.__dict__['config'] = self.config
+        nkas.__dict__['device'] = self.device
+        self.config.task = name_to_function(task)
+        self.config.bind(task)
+
+        label = f'Loop:{task}'
+        last = [None]
+        screenshot = self.device.screenshot
+
+        def timed_screenshot():
+            now = time.perf_counter()
+            if last[0] is not None:
+                self.recorder.add(label, now - last[0])
+            last[0] = now
+            return screenshot()
+
+        self.device.screenshot = timed_screenshot
+        self.device.screenshot_budget = self.budget
+        start = time.perf_counter()
+        try:
+            getattr(nkas, inflection.underscore(task))()
+        except (ReplayEnd, TaskEnd):
+            pass
+        except Exception as e:
+            logger.warning(f'Task {task} ended with {type(e).__name__}: {e}')
+        finally:
+            self.recorder.add(f'Task:{task}', time.perf_counter() - start)
+            self.device.screenshot_budget = None
+            del self.device.screenshot
+
+    def run(self, tasks=()):
+        self.run_screenshot()
+        self.run_button()
+        self.run_ocr()
+        self.run_ui()
+        for task in tasks:
+            self.run_task(task)
+        if self.skipped:
+            logger.warning(f'Skipped benchmarks: {", ".join(self.skipped)}')
+        return self.recorder.report()
+
+
+def show(report):
+    logger.hr('Result', level=1)
+    logger.info(f'{"Label":<40}{"Count":>8}{"p50":>10}{"p95":>10}{"p99":>10}  (ms)')
+    for label, data in report.items():
+        logger.info(f'{label:<40}{data["count"]:>8}{data["p50"]:>10.3f}{data["p95"]:>10.3f}{data["p99"]:>10.3f}')
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Args:
+        report (dict):
+        baseline (dict):
+        tolerance (float): Allowed relative increase of p95.
+
+    Returns:
+        list[str]: Labels regressed.
+    """
+    regressed = []
+    for label, data in report.items():
+        if label not in baseline or label.startswith('Task:'):
+            continue
+        old = baseline[label]['p95']
+        if old > 0 and data['p95'] > old * (1 + tolerance):
+            logger.warning(f'Regression: {label} p95 {old:.3f}ms -> {data["p95"]:.3f}ms')
+            regressed.append(label)
+    return regressed
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.join(os.path.dirname(__file__), '../'))
+
+    parser = argparse.ArgumentParser(description='NKAS screenshot and detection latency benchmark')
+    parser.add_argument('--frames', required=True, help='Folder of recorded 720x1280 screenshots')
+    parser.add_argument('--config', default='template', help='Config name under ./config')
+    parser.add_argument('--task', action='append', default=[], help='Task to replay, such as Reward')
+    parser.add_argument('--budget', type=int, default=50, help='Maximum screenshots per UI detection or task')
+    parser.add_argument('--save', help='Save result as json')
+    parser.add_argument('--baseline', help='Compare p95 with a saved result, exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative increase of p95')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    if not frames:
+        logger.critical('No frames to replay')
+        sys.exit(1)
+
+    report = Benchmark(frames, config_name=args.config, budget=args.budget).run(tasks=args.task)
+    show(report)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f'Saved: {args.save}')
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, tolerance=args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,74 @@
+"""
+Build glyph banks for Ocr(glyph=...) from single line crops, labelled by the OCR model.
+
+    python -m dev_tools.glyph_bank --crops ./crops --font arena_power --model arena --letter 247,247,247
+
+Glyphs are saved to ./assets/glyph/<font>.json, check the read back accuracy printed at the end.
+Commit the bank, then pass glyph=<font> to the Ocr reading that font to enable glyph matching.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from module.base.utils import load_image
+from module.logger import logger
+from module.ocr.glyph import GlyphReader
+from module.ocr.models import OCR_MODEL
+
+
+def build(crops, font, model, letter=(255, 255, 255), threshold=128, alphabet=None):
+    """
+    Args:
+        crops (str): Folder of single line images.
+        font (str): Name of the glyph bank.
+        model (str): OCR model to label crops, such as 'arena'
+        letter (tuple(int)): Letter RGB.
+        threshold (int):
+        alphabet (str): Characters to learn, None to learn all.
+
+    Returns:
+        GlyphReader:
+    """
+    files = sorted(f for f in os.listdir(crops) if os.path.splitext(f)[1].lower() in ['.png', '.jpg', '.bmp'])
+    images = [load_image(os.path.join(crops, f)) for f in files]
+    logger.hr(f'Glyph bank {font}, {len(images)} crops', level=1)
+
+    reader = GlyphReader(font, letter=letter, threshold=threshold, alphabet=alphabet)
+    results = OCR_MODEL.ocr_single_lines(model, images)
+    learnt = sum(reader.learn(image, result) for image, result in zip(images, results))
+    logger.attr('Glyphs learnt', learnt)
+    logger.attr('Characters', ''.join(sorted(set(reader.bank.chars))))
+
+    same, fallback = 0, 0
+    for file, image, expected in zip(files, images, results):
+        expected = ''.join(expected['text'])
+        actual = reader.read(image)
+        if actual is None:
+            fallback += 1
+        elif actual['text'] == expected:
+            same += 1
+        else:
+            logger.warning(f'{file}: model "{expected}", glyph "{actual["text"]}"')
+    logger.attr('Same text', f'{same}/{len(files)}')
+    logger.attr('Fallback to model', f'{fallback}/{len(files)}')
+    return reader
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.join(os.path.dirname(__file__), '../'))
+
+    parser = argparse.ArgumentParser(description='Build glyph bank from OCR model results')
+    parser.add_argument('--crops', required=True, help='Folder of single line crops')
+    parser.add_argument('--font', required=True, help='Name of the glyph bank')
+    parser.add_argument('--model', default='nikke', help='Key of OcrModel.MODELS to label crops')
+    parser.add_argument('--letter', default='255,255,255', help='Letter RGB, such as 247,247,247')
+    parser.add_argument('--threshold', type=int, default=128)
+    parser.add_argument('--alphabet', default=None, help='Characters to learn, default to all')
+    args = parser.parse_args()
+
+    reader = build(args.crops, font=args.font, model=args.model,
+                   letter=tuple(int(c) for c in args.letter.split(',')),
+                   threshold=args.threshold, alphabet=args.alphabet)
+    reader.bank.save()
@@ -0,0 +1,132 @@
+"""
+Export OCR recognition models to ONNX and check them against the pytorch models.
+
+Export all models in OcrModel.MODELS, next to their checkpoints:
+    python -m dev_tools.ocr_onnx export
+    python -m dev_tools.ocr_onnx export --model nikke --model arena --quantize
+
+Compare on a folder of single line crops, exit 1 if accuracy differs:
+    python -m dev_tools.ocr_onnx parity --crops ./crops --model nikke --backend onnx_int8
+
+Then select the backend in Optimization.OcrBackend.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from module.base.utils import load_image
+from module.logger import logger
+from module.ocr.models import OcrModel
+from module.ocr.nikke_ocr import onnx_model_file
+
+
+def export(name, quantize=False):
+    """
+    Same as `cnocr export-onnx`, which fails on cnocr 2.2.2.3 because it calls CnOcr with outdated arguments.
+
+    Args:
+        name (str): Key of OcrModel.MODELS
+        quantize (bool): Also export an int8 dynamic quantized model.
+    """
+    import onnx
+    import torch
+    from cnocr.recognizer import Recognizer
+
+    config = OcrModel.MODELS[name]
+    model_fp = config['root'] + config['model_name']
+    output = onnx_model_file(model_fp)
+    logger.info(f'Export {name}: {model_fp} -> {output}')
+
+    model = Recognizer(config['rec_model_name'], model_fp=model_fp, model_backend='pytorch')._model
+    # Post processor can't be exported, cnocr runs it on onnx outputs
+    model.postprocessor = None
+    x = torch.randn(1, 1, 32, 280)
+    input_lengths = torch.tensor([280])
+    with torch.no_grad():
+        model.eval()
+        torch.onnx.export(
+            model,
+            args=(x, input_lengths),
+            f=output,
+            export_params=True,
+            do_constant_folding=True,
+            input_names=['x', 'input_lengths'],
+            output_names=['logits', 'output_lengths'],
+            dynamic_axes={
+                'x': {0: 'batch_size', 3: 'width'},
+                'input_lengths': {0: 'batch_size'},
+                'logits': {0: 'batch_size'},
+            },
+        )
+    onnx.checker.check_model(onnx.load(output))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized = onnx_model_file(model_fp, quantized=True)
+        logger.info(f'Quantize {name}: {output} -> {quantized}')
+        quantize_dynamic(output, quantized, weight_type=QuantType.QInt8)
+
+
+def parity(name, crops, backend='onnx'):
+    """
+    Args:
+        name (str): Key of OcrModel.MODELS
+        crops (str): Folder of single line images.
+        backend (str): 'onnx' or 'onnx_int8'
+
+    Returns:
+        bool: If the backend gives the same text as pytorch on all crops.
+    """
+    files = sorted(f for f in os.listdir(crops) if os.path.splitext(f)[1].lower() in ['.png', '.jpg', '.bmp'])
+    images = [load_image(os.path.join(crops, f)) for f in files]
+    logger.hr(f'Parity {name} pytorch vs {backend}, {len(images)} crops', level=1)
+
+    models = OcrModel()
+    result = {}
+    for b in ['pytorch', backend]:
+        model = models.load(name, backend=b)
+        if model.backend != b:
+            logger.critical(f'Model {name} is not exported to {backend}')
+            return False
+        start = time.perf_counter()
+        result[b] = model.ocr_for_single_lines(images, batch_size=OcrModel.BATCH_SIZE)
+        logger.attr(f'{b} cost', f'{(time.perf_counter() - start) * 1000 / max(len(images), 1):.2f}ms per crop')
+
+    same = 0
+    max_score_diff = 0.
+    for file, expected, actual in zip(files, result['pytorch'], result[backend]):
+        expected_text, actual_text = ''.join(expected['text']), ''.join(actual['text'])
+        if expected_text == actual_text:
+            same += 1
+        else:
+            logger.warning(f'{file}: pytorch "{expected_text}", {backend} "{actual_text}"')
+        max_score_diff = max(max_score_diff, abs(float(expected['score']) - float(actual['score'])))
+
+    logger.attr('Same text', f'{same}/{len(files)}')
+    logger.attr('Max score diff', f'{max_score_diff:.4f}')
+    return same == len(files)
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.join(os.path.dirname(__file__), '../'))
+
+    parser = argparse.ArgumentParser(description='Export OCR models to ONNX')
+    parser.add_argument('command', choices=['export', 'parity'])
+    parser.add_argument('--model', action='append', default=[], help='Key of OcrModel.MODELS, default to all')
+    parser.add_argument('--quantize', action='store_true', help='Also export int8 quantized models')
+    parser.add_argument('--crops', help='Folder of single line crops, for parity')
+    parser.add_argument('--backend', default='onnx', choices=['onnx', 'onnx_int8'], help='Backend to compare')
+    args = parser.parse_args()
+
+    names = args.model or list(OcrModel.MODELS.keys())
+    if args.command == 'export':
+        for name in names:
+            export(name, quantize=args.quantize)
+    else:
+        if not args.crops:
+            parser.error('--crops is required for parity')
+        if not all([parity(name, args.crops, backend=args.backend) for name in names]):
+            sys.exit(1)
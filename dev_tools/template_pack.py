@@ -0,0 +1,37 @@
+"""
+Pack all assets referenced by module/*/assets.py into ./assets/template.pack.
+Run it after dev_tools/button_extract.py, templates changed later are ignored until the pack is rebuilt.
+
+    python -m dev_tools.template_pack
+"""
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from module.base.button import Button
+from module.base.resource import Resource
+from module.base.template_pack import TemplatePack
+from module.logger import logger
+
+MODULE_FOLDER = './module'
+BUTTON_FILE = 'assets.py'
+
+
+def import_assets():
+    for module in sorted(os.listdir(MODULE_FOLDER)):
+        if os.path.exists(os.path.join(MODULE_FOLDER, module, BUTTON_FILE)):
+            importlib.import_module(f'module.{module}.assets')
+
+
+if __name__ == '__main__':
+    os.chdir(os.path.join(os.path.dirname(__file__), '../'))
+    import_assets()
+    buttons = [b for b in Resource.instances.values() if isinstance(b, Button)]
+    # Don't read the outdated pack while building
+    TemplatePack._loaded = True
+    for button in buttons:
+        button._match_init = False
+    TemplatePack.build(buttons)
+    logger.info(f'Saved: {TemplatePack.FILE}')
@@ -1,9 +1,17 @@
 import os
 import re
+import sys
+import threading
 import time
 from datetime import datetime, timedelta
 from functools import cached_property
 
+from module.base.import_profiler import IMPORT_PROFILER
+
+# Profile imports from the very beginning, see `python main.py --help`
+if __name__ == "__main__" and "--import-time" in sys.argv:
+    IMPORT_PROFILER.start()
+
 import inflection
 
 from module.config.config import NikkeConfig, TaskEnd
@@ -17,12 +25,26 @@ from module.exception import (
     GameStart,
 )
 from module.logger import logger
+from module.ocr.telemetry import OCR_TELEMETRY
 
 
 class NikkeAutoScript:
-    def __init__(self, config_name="nkas"):
+    def __init__(self, config_name="nkas", stop_event=None):
+        """
+        Args:
+            config_name (str):
+            stop_event (threading.Event): Set by ProcessManager to stop while waiting for tasks.
+        """
         logger.hr("Start", level=0)
         self.config_name = config_name
+        self.stop_event = stop_event
+        if stop_event is not None:
+            def forward():
+                # Process shared events can't be waited together with local ones, forward it
+                stop_event.wait()
+                NikkeConfig.wakeup.set()
+
+            threading.Thread(target=forward, name="StopEvent", daemon=True).start()
 
     @cached_property
     def config(self):
@@ -51,6 +73,8 @@ class NikkeAutoScript:
             exit(1)
 
     def run(self, command):
+        # Config modifications during task are written at task end
+        self.config.write_behind = True
         try:
             self.device.screenshot()
             self.__getattribute__(command)()
@@ -99,6 +123,10 @@ class NikkeAutoScript:
             logger.exception(e)
             exit(1)
 
+        finally:
+            self.config.write_behind = False
+            self.config.flush()
+
     def save_error_log(self):
         """
         Save last 60 screenshots in ./log/error/<timestamp>
@@ -261,24 +289,30 @@ class NikkeAutoScript:
             bool: True if wait finished, False if config changed.
         """
         future = future + timedelta(seconds=1)
+        # No screenshots needed while waiting, prefetch restarts at the next screenshot
+        if "device" in self.__dict__:
+            self.device.screenshot_prefetch_stop()
         """
             记录开始等待任务时，配置文件的最后更改时间
         """
         self.config.start_watching()
         while 1:
-            if datetime.now() > future:
+            remain = (future - datetime.now()).total_seconds()
+            if remain <= 0:
                 return True
 
-            # if self.stop_event is not None:
-            #     if self.stop_event.is_set():
-            #         logger.info("Update event detected")
-            #         logger.info(f"[{self.config_name}] exited. Reason: Update")
-            #         exit(0)
+            if self.stop_event is not None:
+                if self.stop_event.is_set():
+                    logger.info("Update event detected")
+                    logger.info(f"[{self.config_name}] exited. Reason: Update")
+                    exit(0)
 
-            time.sleep(5)
             """
-                在等待过程中持续对比配置文件的最后更改时间
+                等待到任务时间，或被配置文件更改、停止信号唤醒
             """
+            self.config.wait_change(timeout=remain)
+            if self.stop_event is not None and self.stop_event.is_set():
+                continue
             if self.config.should_reload():
                 return False
 
@@ -348,12 +382,27 @@ class NikkeAutoScript:
     def loop(self):
         logger.set_file_logger(self.config_name)
         logger.info(f"Start scheduler loop: {self.config_name}")
+        if self.config.Optimization_OcrServer or self.config.Optimization_OcrPreload \
+                or self.config.Optimization_OcrBackend != 'pytorch':
+            from module.ocr.models import OCR_MODEL
+
+            OCR_MODEL.set_backend(self.config.Optimization_OcrBackend, threads=self.config.Optimization_OcrThreads)
+            if self.config.Optimization_OcrServer:
+                OCR_MODEL.use_server()
+            if self.config.Optimization_OcrPreload:
+                # Load models in background while connecting to device
+                tasks = [task for task in self.config.data if self.config.is_task_enabled(task)]
+                OCR_MODEL.preload(OCR_MODEL.task_models(tasks))
         is_first = True
         failure_record = {}
 
         while 1:
             task = self.get_next_task()
             _ = self.device
+            if IMPORT_PROFILER.running:
+                # Imports until device is ready
+                IMPORT_PROFILER.stop()
+                IMPORT_PROFILER.show()
 
             if is_first and task == "Restart":
                 logger.info("Skip task `Restart` at scheduler start")
@@ -365,6 +414,7 @@ class NikkeAutoScript:
             logger.info(f"Scheduler: Start task `{task}`")
             self.device.stuck_record_clear()
             self.device.click_record_clear()
+            self.device.screenshot_interval_set(task)
             logger.hr(task, level=0)
             """
 
@@ -375,8 +425,11 @@ class NikkeAutoScript:
 
             """
 
+            OCR_TELEMETRY.task = task
             success = self.run(inflection.underscore(task))
             logger.info(f"Scheduler: End task `{task}`")
+            OCR_TELEMETRY.show(task=task)
+            OCR_TELEMETRY.dump(f"./log/ocr/{self.config_name}")
             is_first = False
 
             """
@@ -408,5 +461,13 @@ class NikkeAutoScript:
 
 
 if __name__ == "__main__":
-    nkas = NikkeAutoScript()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NIKKEAutoScript")
+    parser.add_argument("--config", default="nkas", help="Config name under ./config")
+    parser.add_argument("--import-time", action="store_true",
+                        help="Show import time of modules once device is connected")
+    args = parser.parse_args()
+
+    nkas = NikkeAutoScript(config_name=args.config)
     nkas.loop()
\ No newline at end of file
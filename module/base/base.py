@@ -8,6 +8,7 @@ from module.config.config import NikkeConfig
 from module.device.device import Device
 from module.logger import logger
 from module.ocr.models import OCR_MODEL
+from module.ocr.telemetry import OCR_TELEMETRY
 
 
 class ModuleBase:
@@ -103,8 +104,10 @@ class ModuleBase:
             if not self.interval_timer[text].reached():
                 return False
 
-        res = self.ocr_models.__getattribute__(model).ocr(self.device.image, area=area)
+        start_time = time.time()
+        res = self.ocr_models.ocr(model, self.device.image, area=area)
         location = self.device.get_location(text, res)
+        OCR_TELEMETRY.observe('latency', time.time() - start_time, site=text, model=model)
         if location:
             if interval:
                 self.interval_timer[text].reset()
@@ -140,7 +143,10 @@ class ModuleBase:
 
     def ocr(self, image, label='', model='cnocr'):
         start_time = time.time()
-        result = self.ocr_models.__getattribute__(model).ocr(image)
+        result = self.ocr_models.ocr(model, image)
+        OCR_TELEMETRY.observe('latency', time.time() - start_time, site=label, model=model)
+        for line in result:
+            OCR_TELEMETRY.observe('score', float(line.get('score', 0)), site=label, model=model)
         if len(result):
             text = result[0].get('text')
             logger.attr(name='%s %ss' % (label, float2str(time.time() - start_time)),
@@ -2,14 +2,26 @@ import os
 from functools import cached_property
 
 import cv2
-import imageio
 import numpy as np
 
+from module.base.frame import Frame
 from module.base.resource import Resource
-from module.base.utils import crop, load_image, area_offset, color_similar, get_color, mask_area, find_center
+from module.base.template_pack import TemplatePack
+from module.base.utils import crop, load_image, area_offset, color_similar, get_color, find_center
 
 
 class Button(Resource):
+    # Coarse-to-fine search of non-static match()
+    # Templates are matched on the screenshot downscaled `PYRAMID_LEVEL` times first,
+    # then refined at full size around the best `PYRAMID_PEAKS` candidates.
+    PYRAMID_LEVEL = 2
+    # Templates smaller than this at the coarse level use fewer levels,
+    # small templates lose too much detail to rank the right position
+    PYRAMID_MIN_SIZE = 24
+    # Candidates at the coarse level need similarity > threshold - PYRAMID_MARGIN
+    PYRAMID_MARGIN = 0.2
+    PYRAMID_PEAKS = 5
+
     def __init__(self, area, color, button, file=None, name=None):
         """Initialize a Button instance.
 
@@ -42,6 +54,10 @@ class Button(Resource):
         self.image = None
         self.image_binary = None
         self.image_luma = None
+        self._pyramid = None
+        # Detection results on the latest frame
+        self._frame_id = None
+        self._frame_cache = {}
 
         if self.file:
             self.resource_add(key=self.file)
@@ -98,7 +114,11 @@ class Button(Resource):
         If needs to call self.match, call this first.
         """
         if not self._match_init:
-            if self.is_gif:
+            frames = TemplatePack.get(self.file, self.area)
+            if frames is not None:
+                self.image = frames if self.is_gif else frames[0]
+            elif self.is_gif:
+                import imageio
                 self.image = []
                 for image in imageio.mimread(self.file):
                     image = image[:, :, :3].copy() if len(image.shape) == 3 else image
@@ -108,21 +128,102 @@ class Button(Resource):
                 self.image = load_image(self.file, self.area)
             self._match_init = True
 
-    def match(self, image, offset=30, threshold=0.85, static=True) -> bool:
-        self.ensure_template()
+    @property
+    def pyramid(self):
+        """
+        Returns:
+            list[np.ndarray]: Template downscaled by cv2.pyrDown(), index 0 is the full size one.
+                Levels are added until PYRAMID_LEVEL or the template becomes smaller than PYRAMID_MIN_SIZE.
+        """
+        if self._pyramid is None:
+            self.ensure_template()
+            pyramid = [self.image]
+            while len(pyramid) <= self.PYRAMID_LEVEL:
+                image = cv2.pyrDown(pyramid[-1])
+                if min(image.shape[:2]) < self.PYRAMID_MIN_SIZE:
+                    break
+                pyramid.append(image)
+            self._pyramid = pyramid
+        return self._pyramid
+
+    def frame_cache(self, image):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            dict: Detection results of this button on the given frame,
+                or None if image is not the latest screenshot.
+                Results on the previous frame are kept if their search area didn't change.
+        """
+        frame_id = Frame.get_frame_id(image)
+        if frame_id is None:
+            return None
+        if frame_id != self._frame_id:
+            if self._frame_id is None:
+                self._frame_cache = {}
+            else:
+                self._frame_cache = {
+                    key: value for key, value in self._frame_cache.items()
+                    if not Frame.area_changed(value[-1], since=self._frame_id)
+                }
+            self._frame_id = frame_id
+        return self._frame_cache
+
+    def search_area(self, image, offset=30, static=True):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+            offset (int, tuple):
+            static (bool):
+
+        Returns:
+            tuple: Area that Button.match() would search in.
+        """
         if static:
-            if isinstance(offset, tuple):
-                if len(offset) == 2:
-                    offset = np.array((-offset[0], -offset[1], offset[0], offset[1]))
-                else:
-                    offset = np.array(offset)
+            return tuple(self._static_offset(offset) + self.area)
+        else:
+            h, w = image.shape[:2]
+            return 0, 0, w, h
+
+    @staticmethod
+    def _static_offset(offset):
+        if isinstance(offset, tuple):
+            if len(offset) == 2:
+                return np.array((-offset[0], -offset[1], offset[0], offset[1]))
             else:
-                offset = np.array((-3, -offset, 3, offset))
+                return np.array(offset)
+        else:
+            return np.array((-3, -offset, 3, offset))
 
-            image = crop(image, offset + self.area)
+    def match(self, image, offset=30, threshold=0.85, static=True) -> bool:
+        cache = self.frame_cache(image)
+        if cache is None:
+            return self._match(image, offset=offset, threshold=threshold, static=static)
 
-        res = cv2.matchTemplate(self.image, image, cv2.TM_CCOEFF_NORMED)
-        _, similarity, _, upper_left = cv2.minMaxLoc(res)
+        key = ('match', offset if isinstance(offset, (int, float)) else tuple(offset), threshold, static)
+        if key in cache:
+            result, button_offset, _ = cache[key]
+            if result:
+                self._button_offset = button_offset
+            return result
+
+        result = self._match(image, offset=offset, threshold=threshold, static=static)
+        cache[key] = (result, self._button_offset, self.search_area(image, offset=offset, static=static))
+        return result
+
+    def _match(self, image, offset=30, threshold=0.85, static=True) -> bool:
+        self.ensure_template()
+        if static:
+            offset = self._static_offset(offset)
+            image = crop(image, offset + self.area)
+            res = cv2.matchTemplate(self.image, image, cv2.TM_CCOEFF_NORMED)
+            _, similarity, _, upper_left = cv2.minMaxLoc(res)
+        elif not self.is_gif and len(self.pyramid) > 1:
+            similarity, upper_left = self._match_pyramid(image, threshold=threshold)
+        else:
+            res = cv2.matchTemplate(self.image, image, cv2.TM_CCOEFF_NORMED)
+            _, similarity, _, upper_left = cv2.minMaxLoc(res)
         # print(self.name, similarity)
 
         if similarity > threshold:
@@ -145,15 +246,148 @@ class Button(Resource):
         #     return False
         # else:
 
+    @staticmethod
+    def _peaks(res, threshold, limit=None):
+        """
+        Args:
+            res (np.ndarray): Response map of cv2.matchTemplate().
+            threshold (float):
+            limit (int): Maximum amount of peaks.
+
+        Returns:
+            list[tuple[float, int, int]]: (similarity, x, y) of local maximums above threshold,
+                in descending order of similarity.
+        """
+        peaks = (res >= cv2.dilate(res, np.ones((3, 3), dtype=np.uint8))) & (res > threshold)
+        ys, xs = np.nonzero(peaks)
+        scores = res[ys, xs]
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(float(scores[i]), int(xs[i]), int(ys[i])) for i in order]
+
+    def _pyramid_refine(self, image, threshold=0.85, limit=None):
+        """
+        Search template on the whole image, coarse to fine.
+
+        Args:
+            image (np.ndarray): Screenshot.
+            threshold (float):
+            limit (int): Maximum amount of coarse candidates to refine.
+
+        Yields:
+            float, tuple: Similarity, upper left of each refined candidate,
+                in descending order of coarse similarity.
+        """
+        level = len(self.pyramid) - 1
+        scale = 2 ** level
+        template = self.pyramid[level]
+        coarse = Frame.pyramid(image, level)
+        if coarse.shape[0] < template.shape[0] or coarse.shape[1] < template.shape[1]:
+            yield from self._full_match(image, threshold=threshold, limit=limit)
+            return
+
+        res = cv2.matchTemplate(template, coarse, cv2.TM_CCOEFF_NORMED)
+        peaks = self._peaks(res, threshold=threshold - self.PYRAMID_MARGIN, limit=limit)
+        if not peaks:
+            # Coarse level may underrate the template, confirm at full size before giving up
+            yield from self._full_match(image, threshold=threshold, limit=limit)
+            return
+
+        h, w = image.shape[:2]
+        th, tw = self.image.shape[:2]
+        for _, x, y in peaks:
+            # Refine in a window of +-scale around the candidate at full size
+            x1, y1 = max(x * scale - scale, 0), max(y * scale - scale, 0)
+            x2, y2 = min(x * scale + tw + scale, w), min(y * scale + th + scale, h)
+            if x2 - x1 < tw or y2 - y1 < th:
+                continue
+            res_fine = cv2.matchTemplate(self.image, image[y1:y2, x1:x2], cv2.TM_CCOEFF_NORMED)
+            _, similarity, _, point = cv2.minMaxLoc(res_fine)
+            yield similarity, (int(x1 + point[0]), int(y1 + point[1]))
+
+    def _full_match(self, image, threshold=0.85, limit=None):
+        """
+        Search template on the whole image at full size.
+
+        Yields:
+            float, tuple: Similarity, upper left of each peak above threshold,
+                in descending order of similarity.
+        """
+        res = cv2.matchTemplate(self.image, image, cv2.TM_CCOEFF_NORMED)
+        for similarity, x, y in self._peaks(res, threshold=threshold, limit=limit):
+            yield similarity, (x, y)
+
+    def _match_pyramid(self, image, threshold=0.85):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+            threshold (float):
+
+        Returns:
+            float, tuple: Similarity, upper left of the best position.
+                Similarity is 0 if template is not found.
+        """
+        similarity, upper_left = 0., (0, 0)
+        for sim, point in self._pyramid_refine(image, threshold=threshold, limit=self.PYRAMID_PEAKS):
+            if sim > similarity:
+                similarity, upper_left = sim, point
+                if similarity > threshold:
+                    break
+        return similarity, upper_left
+
     def match_several(self, image, offset=30, threshold=0.85, static=True) -> list[dict]:
-        # areas = set()
-        areas = []
-        while 1:
-            if self.match(image, offset=offset, threshold=threshold, static=static):
-                areas.append({'area': self._button_offset, 'location': self.location})
-                image = mask_area(image, self._button_offset)
+        """
+        Find all appearances of the template in one pass.
+
+        Args:
+            image (np.ndarray): Screenshot.
+            offset (int, tuple):
+            threshold (float):
+            static (bool):
+
+        Returns:
+            list[dict]: {'area': tuple, 'location': tuple, 'similarity': float},
+                in descending order of similarity.
+                Appearances overlapping a more similar one are dropped.
+        """
+        cache = self.frame_cache(image)
+        key = ('match_several', offset if isinstance(offset, (int, float)) else tuple(offset), threshold, static)
+        if cache is not None and key in cache:
+            result = cache[key][0]
+        else:
+            result = self._match_several(image, offset=offset, threshold=threshold, static=static)
+            if cache is not None:
+                cache[key] = (result, self.search_area(image, offset=offset, static=static))
+
+        if result:
+            self._button_offset = result[-1]['area']
+        return [dict(r) for r in result]
+
+    def _match_several(self, image, offset=30, threshold=0.85, static=True) -> list[dict]:
+        self.ensure_template()
+        if static:
+            offset = self._static_offset(offset)
+            res = cv2.matchTemplate(self.image, crop(image, offset + self.area), cv2.TM_CCOEFF_NORMED)
+            candidates = [(similarity, (x, y)) for similarity, x, y in self._peaks(res, threshold=threshold)]
+        elif not self.is_gif and len(self.pyramid) > 1:
+            candidates = [c for c in self._pyramid_refine(image, threshold=threshold) if c[0] > threshold]
+            candidates.sort(key=lambda c: -c[0])
+        else:
+            res = cv2.matchTemplate(self.image, image, cv2.TM_CCOEFF_NORMED)
+            candidates = [(similarity, (x, y)) for similarity, x, y in self._peaks(res, threshold=threshold)]
+
+        h, w = self.area[3] - self.area[1], self.area[2] - self.area[0]
+        result = []
+        for similarity, upper_left in candidates:
+            if static:
+                area = area_offset(self._button, offset[:2] + np.array(upper_left))
             else:
-                return areas
+                area = (upper_left[0], upper_left[1], upper_left[0] + w, upper_left[1] + h)
+            # Non-maximum suppression
+            if any(area[0] < a[2] and a[0] < area[2] and area[1] < a[3] and a[1] < area[3]
+                   for a in (r['area'] for r in result)):
+                continue
+            result.append({'area': area, 'location': find_center(area), 'similarity': similarity})
+        return result
 
     def appear_on(self, image, threshold=10) -> bool:
         """Check if the button appears on the image.
@@ -165,11 +399,19 @@ class Button(Resource):
         Returns:
             bool: True if button appears on screenshot.
         """
-        return color_similar(
+        cache = self.frame_cache(image)
+        key = ('appear_on', threshold)
+        if cache is not None and key in cache:
+            return cache[key][0]
+
+        result = color_similar(
             color1=get_color(image, self.area),
             color2=self.color,
             threshold=threshold
         )
+        if cache is not None:
+            cache[key] = (result, self.area)
+        return result
 
     def match_appear_on(self, image, threshold=30) -> bool:
         """
@@ -183,3 +425,161 @@ class Button(Resource):
         diff = np.subtract(self.button, self._button)[:2]
         area = area_offset(self.area, offset=diff)
         return color_similar(color1=get_color(image, area), color2=self.color, threshold=threshold)
+
+
+class ButtonGroup:
+    # Buttons whose area differs from the template average by more than this are not template matched.
+    # Looser than COLOR_SIMILAR_THRESHOLD, as buttons may move within `offset`
+    # and the average of the static area is then a bit off.
+    COLOR_THRESHOLD = 30
+
+    def __init__(self, buttons, offset=(30, 30)):
+        """
+        Detect a group of static buttons on one screenshot, such as all page check buttons.
+
+        Templates, areas and search windows of all buttons are packed into arrays on first use,
+        so that a single vectorized pass over the integral image can rank every button by
+        its average color, and template matching only runs on the candidates close in color.
+
+        Args:
+            buttons (list[Button]):
+            offset (tuple): (x, y), the same as `offset` in Button.match().
+        """
+        self.buttons = list(buttons)
+        self.offset = offset
+        self._match_init = False
+        self.templates = []
+        self.areas = None
+        self.search_areas = None
+        self.template_colors = None
+        self._frame_id = None
+        self._frame_cache = {}
+
+    def __len__(self):
+        return len(self.buttons)
+
+    def ensure_template(self):
+        if not self._match_init:
+            templates = []
+            for button in self.buttons:
+                button.ensure_template()
+                templates.append(button.image if isinstance(button.image, list) else [button.image])
+            self.templates = templates
+            self.areas = np.array([button.area for button in self.buttons], dtype=np.int32)
+            x, y = self.offset
+            self.search_areas = self.areas + np.array((-x, -y, x, y), dtype=np.int32)
+            self.template_colors = np.array([cv2.mean(images[0])[:3] for images in templates])
+            self._match_init = True
+
+    def color_distance(self, image) -> np.ndarray:
+        """
+        Color difference between each button area and its template, in the same measure as color_similar().
+
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            np.ndarray: Shape (n,)
+        """
+        self.ensure_template()
+        h, w = image.shape[:2]
+        integral = cv2.integral(image)
+        x1, y1, x2, y2 = np.clip(self.areas, 0, (w, h, w, h)).T
+        total = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        size = np.maximum((x2 - x1) * (y2 - y1), 1)
+        diff = total[:, :3] / size[:, np.newaxis] - self.template_colors
+        return np.max(np.maximum(diff, 0), axis=1) - np.min(np.minimum(diff, 0), axis=1)
+
+    def _match_index(self, image, index):
+        """
+        Returns:
+            float, tuple: Similarity, upper left of the best position in search area.
+        """
+        x1, y1, x2, y2 = self.search_areas[index]
+        h, w = image.shape[:2]
+        if x1 >= 0 and y1 >= 0 and x2 <= w and y2 <= h:
+            search = image[y1:y2, x1:x2]
+        else:
+            search = crop(image, (x1, y1, x2, y2))
+
+        similarity, upper_left = 0., (0, 0)
+        for template in self.templates[index]:
+            res = cv2.matchTemplate(template, search, cv2.TM_CCOEFF_NORMED)
+            _, sim, _, point = cv2.minMaxLoc(res)
+            if sim > similarity:
+                similarity, upper_left = sim, point
+        return similarity, upper_left
+
+    def frame_cache(self, image):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            dict: Detection results of this group on the given frame,
+                or None if image is not the latest screenshot.
+                Results on the previous frame are kept if none of the search areas changed.
+        """
+        frame_id = Frame.get_frame_id(image)
+        if frame_id is None:
+            return None
+        if frame_id != self._frame_id:
+            if self._frame_id is None or any(
+                    Frame.area_changed(area, since=self._frame_id) for area in self.search_areas):
+                self._frame_cache = {}
+            self._frame_id = frame_id
+        return self._frame_cache
+
+    def match(self, image, threshold=0.85):
+        """
+        Find the button which appears on the image.
+        Buttons with color distance above COLOR_THRESHOLD are skipped, the others are verified
+        in order of color distance and the search stops at the first match.
+
+        Args:
+            image (np.ndarray): Screenshot.
+            threshold (float):
+
+        Returns:
+            int, dict[int, float]: Index of the matched button or None,
+                and similarity of the verified buttons.
+        """
+        self.ensure_template()
+        cache = self.frame_cache(image)
+        if cache is not None and threshold in cache:
+            index, scores, button_offset = cache[threshold]
+            if index is not None:
+                self.buttons[index]._button_offset = button_offset
+            return index, dict(scores)
+
+        index, scores = self._match(image, threshold=threshold)
+        if cache is not None:
+            button_offset = self.buttons[index]._button_offset if index is not None else None
+            cache[threshold] = (index, dict(scores), button_offset)
+        return index, scores
+
+    def _match(self, image, threshold=0.85):
+        scores = {}
+        distance = self.color_distance(image)
+        for index in np.argsort(distance, kind='stable'):
+            if distance[index] > self.COLOR_THRESHOLD:
+                break
+            similarity, upper_left = self._match_index(image, index)
+            scores[int(index)] = similarity
+            if similarity > threshold:
+                button = self.buttons[index]
+                button._button_offset = area_offset(button._button, self.search_areas[index][:2] + np.array(upper_left))
+                return int(index), scores
+
+        return None, scores
+
+    def match_all(self, image):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            np.ndarray: Similarity of each button.
+        """
+        self.ensure_template()
+        return np.array([self._match_index(image, index)[0] for index in range(len(self.buttons))])
@@ -0,0 +1,246 @@
+import zlib
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+
+class Frame:
+    """
+    Record the identity of the latest screenshot.
+
+    Screenshots are split into tiles and each tile has a CRC32 checksum.
+    Screenshots with the same content share the same frame id, so detection results
+    of the previous frame can be reused when the screen didn't change,
+    such as loading screens and idle animations.
+    Tile checksums of recent frames are kept, to tell whether an area changed since a given frame.
+    """
+    TILE_SIZE = 64
+    # Amount of frames to keep tile checksums
+    HISTORY_LENGTH = 30
+
+    # Class property, shared by all buttons
+    image = None
+    frame_id = 0
+    fingerprint = None
+    tiles = None
+    history = OrderedDict()
+    # Downscaled levels of the latest screenshot, shared by all buttons
+    pyramids = []
+
+    @classmethod
+    def get_tiles(cls, image):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            np.ndarray: CRC32 of each tile, shape (rows, columns).
+                Costs about 1.5ms on a 720x1280 frame.
+        """
+        size = cls.TILE_SIZE
+        h, w = image.shape[:2]
+        rows, columns = -(-h // size), -(-w // size)
+        tiles = np.zeros((rows, columns), dtype=np.uint32)
+        for row in range(rows):
+            strip = image[row * size:(row + 1) * size]
+            for column in range(columns):
+                tiles[row, column] = zlib.crc32(strip[:, column * size:(column + 1) * size].tobytes())
+        return tiles
+
+    @classmethod
+    def tile_slice(cls, area):
+        """
+        Args:
+            area: (upper_left_x, upper_left_y, bottom_right_x, bottom_right_y).
+
+        Returns:
+            tuple[slice, slice]: Rows and columns of tiles covering the area.
+        """
+        size = cls.TILE_SIZE
+        x1, y1, x2, y2 = [int(round(i)) for i in area]
+        x1, y1 = max(x1, 0) // size, max(y1, 0) // size
+        x2, y2 = -(-max(x2, 0) // size), -(-max(y2, 0) // size)
+        return slice(y1, y2), slice(x1, x2)
+
+    @classmethod
+    def update(cls, image):
+        """
+        Register a new screenshot.
+
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            int: Frame id, unchanged if the new screenshot is pixel-identical to the last one.
+        """
+        tiles = cls.get_tiles(image)
+        fingerprint = zlib.crc32(tiles.tobytes())
+        if fingerprint != cls.fingerprint or cls.tiles is None or cls.tiles.shape != tiles.shape:
+            cls.fingerprint = fingerprint
+            cls.frame_id += 1
+            cls.history[cls.frame_id] = tiles
+            while len(cls.history) > cls.HISTORY_LENGTH:
+                cls.history.popitem(last=False)
+            cls.pyramids = []
+        cls.tiles = tiles
+        cls.image = image
+        return cls.frame_id
+
+    @classmethod
+    def pyramid(cls, image, level):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+            level (int): 1 for half size, 2 for quarter size, etc.
+
+        Returns:
+            np.ndarray: Image downscaled by cv2.pyrDown() `level` times.
+                Levels of the latest screenshot are built once and shared.
+        """
+        if image is not cls.image:
+            for _ in range(level):
+                image = cv2.pyrDown(image)
+            return image
+
+        pyramids = cls.pyramids
+        while len(pyramids) < level:
+            pyramids.append(cv2.pyrDown(pyramids[-1] if pyramids else image))
+        return pyramids[level - 1]
+
+    @classmethod
+    def get_frame_id(cls, image):
+        """
+        Args:
+            image (np.ndarray):
+
+        Returns:
+            int: Frame id if image is the latest screenshot itself, otherwise None.
+                Crops and masked copies of screenshot are not cached.
+        """
+        if image is not None and image is cls.image:
+            return cls.frame_id
+        return None
+
+    @classmethod
+    def changed_tiles(cls, since):
+        """
+        Args:
+            since (int): Frame id.
+
+        Returns:
+            np.ndarray: Boolean mask of tiles changed since the given frame, shape (rows, columns).
+                All True if the frame is too old.
+        """
+        previous = cls.history.get(since)
+        if previous is None or cls.tiles is None or previous.shape != cls.tiles.shape:
+            return np.ones(cls.tiles.shape if cls.tiles is not None else (0, 0), dtype=bool)
+        return previous != cls.tiles
+
+    @classmethod
+    def area_changed(cls, area, since):
+        """
+        Args:
+            area: (upper_left_x, upper_left_y, bottom_right_x, bottom_right_y).
+            since (int): Frame id.
+
+        Returns:
+            bool: If any pixel in area changed since the given frame.
+                True if the frame is too old.
+        """
+        if since == cls.frame_id:
+            return False
+        previous = cls.history.get(since)
+        if previous is None or cls.tiles is None or previous.shape != cls.tiles.shape:
+            return True
+        rows, columns = cls.tile_slice(area)
+        return not np.array_equal(previous[rows, columns], cls.tiles[rows, columns])
+
+    @classmethod
+    def clear(cls):
+        cls.image = None
+        cls.fingerprint = None
+        cls.tiles = None
+        cls.history.clear()
+        cls.pyramids = []
+        cls.frame_id += 1
+
+
+class FrameDeque:
+    def __init__(self, maxlen):
+        """
+        A deque of screenshots which only stores the tiles changed from the previous screenshot.
+        Iterating it yields {'time': datetime, 'image': np.ndarray} like a deque of full screenshots.
+
+        Args:
+            maxlen (int):
+        """
+        self.maxlen = maxlen
+        # Full image of the oldest record
+        self.base = None
+        # Tile checksums of the newest record
+        self.tiles = None
+        # {'time': datetime, 'patch': list[tuple[int, int, np.ndarray]]}
+        self.records = deque()
+
+    def __len__(self):
+        return len(self.records)
+
+    def clear(self):
+        self.base = None
+        self.tiles = None
+        self.records.clear()
+
+    def append(self, data, tiles=None):
+        """
+        Args:
+            data (dict): {'time': datetime, 'image': np.ndarray}
+            tiles (np.ndarray): Tile checksums of the image, calculate if not given.
+        """
+        image = data['image']
+        if tiles is None:
+            tiles = Frame.get_tiles(image)
+
+        if not self.records or self.tiles is None or self.tiles.shape != tiles.shape \
+                or self.base.shape != image.shape:
+            self.records.clear()
+            # Screenshots may be decoded into reused buffers, keep a copy if it has to outlive the next frames
+            self.base = image if self.maxlen <= 1 else image.copy()
+            patch = []
+        else:
+            size = Frame.TILE_SIZE
+            patch = [
+                (row, column, image[row * size:(row + 1) * size, column * size:(column + 1) * size].copy())
+                for row, column in zip(*np.nonzero(self.tiles != tiles))
+            ]
+        self.records.append({'time': data['time'], 'patch': patch})
+        self.tiles = tiles
+
+        while len(self.records) > self.maxlen:
+            self.records.popleft()
+            if not self.records:
+                self.base = None
+                self.tiles = None
+            elif len(self.records) == 1:
+                # The latest screenshot is still valid, reference it directly
+                self.base = image
+            else:
+                self.base = self._apply(self.base.copy(), self.records[0]['patch'])
+            if self.records:
+                self.records[0]['patch'] = []
+
+    @staticmethod
+    def _apply(image, patch):
+        size = Frame.TILE_SIZE
+        for row, column, tile in patch:
+            image[row * size:row * size + tile.shape[0], column * size:column * size + tile.shape[1]] = tile
+        return image
+
+    def __iter__(self):
+        if self.base is None:
+            return
+        image = self.base
+        for record in self.records:
+            if record['patch']:
+                image = self._apply(image.copy(), record['patch'])
+            yield {'time': record['time'], 'image': image}
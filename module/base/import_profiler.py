@@ -0,0 +1,97 @@
+import sys
+import threading
+import time
+from importlib.abc import MetaPathFinder
+
+
+class _TimedLoader:
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self._profiler.stack
+        stack.append(0.)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cost = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cost
+            self._profiler.records[module.__name__] = (cost - children, cost, not stack)
+
+
+class ImportProfiler(MetaPathFinder):
+    """
+    Record import time of each module, like `python -X importtime` but summarized.
+
+    Examples:
+        IMPORT_PROFILER.start()
+        import cnocr
+        IMPORT_PROFILER.stop()
+        IMPORT_PROFILER.show()
+    """
+
+    def __init__(self):
+        # module -> (self seconds, cumulative seconds, is top level import)
+        self.records = {}
+        self._local = threading.local()
+        self.start_time = 0.
+
+    @property
+    def running(self):
+        return self in sys.meta_path
+
+    @property
+    def stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def start(self):
+        if not self.running:
+            self.start_time = time.perf_counter()
+            sys.meta_path.insert(0, self)
+
+    def stop(self):
+        if self.running:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._local, 'finding', False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._local.finding = False
+
+    def show(self, limit=20):
+        from module.logger import logger
+        total = sum(cumulative for _, cumulative, top in self.records.values() if top)
+        logger.hr('Import time', level=2)
+        logger.info(f'{len(self.records)} modules, {total:.3f}s in imports, '
+                    f'{time.perf_counter() - self.start_time:.3f}s since start')
+        logger.info(f'{"cumulative":>10} {"self":>8}  module')
+        records = sorted(self.records.items(), key=lambda x: -x[1][1])[:limit]
+        for name, (cost, cumulative, _) in records:
+            logger.info(f'{cumulative:>10.3f} {cost:>8.3f}  {name}')
+
+
+IMPORT_PROFILER = ImportProfiler()
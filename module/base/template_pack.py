@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from module.logger import logger
+
+
+class TemplatePack:
+    """
+    Pre-cropped templates of all assets in one uncompressed binary file,
+    built by dev_tools/template_pack.py.
+
+    The pack is memory-mapped read-only, templates are zero-copy views into it,
+    so loading a template costs nothing and pages are shared between NKAS processes.
+    Templates missing in the pack, or whose source file content or area changed, return None
+    and callers should decode the asset themselves.
+    """
+    FILE = './assets/template.pack'
+    INDEX = './assets/template.pack.json'
+    VERSION = 3
+
+    # Class property
+    _loaded = False
+    data = None
+    # file -> {'area': list, 'size': int, 'mtime': int, 'sha1': str, 'frames': list[{'offset': int, 'shape': list}]}
+    index = {}
+
+    @classmethod
+    def load(cls):
+        cls._loaded = True
+        if not os.path.exists(cls.FILE) or not os.path.exists(cls.INDEX):
+            return
+        try:
+            # Map pack before reading index, pack is replaced before index when rebuilding
+            data = np.memmap(cls.FILE, dtype=np.uint8, mode='r')
+            with open(cls.INDEX, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != cls.VERSION:
+                logger.warning(f'Template pack version {index.get("version")} is outdated, ignored')
+                return
+            if index.get('size') != data.size:
+                logger.warning('Template pack is being rebuilt, ignored')
+                return
+            cls.data = data
+            cls.index = index['templates']
+        except Exception as e:
+            logger.warning(f'Failed to load template pack: {e}')
+            cls.data = None
+            cls.index = {}
+
+    @classmethod
+    def get(cls, file, area):
+        """
+        Args:
+            file (str): Asset file, such as './assets/cn/ui/MAIN_CHECK.png'
+            area (tuple): Area to crop.
+
+        Returns:
+            list[np.ndarray]: Frames of the template, one frame if it's not a gif.
+                None if not in pack or outdated.
+        """
+        if not cls._loaded:
+            cls.load()
+        if cls.data is None:
+            return None
+        record = cls.index.get(file)
+        if record is None or tuple(record['area']) != tuple(area):
+            return None
+        if not cls.is_latest(file, record):
+            return None
+
+        frames = []
+        for frame in record['frames']:
+            shape = tuple(frame['shape'])
+            offset = frame['offset']
+            frames.append(cls.data[offset:offset + int(np.prod(shape))].reshape(shape))
+        return frames
+
+    @staticmethod
+    def file_hash(file):
+        with open(file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @classmethod
+    def is_latest(cls, file, record):
+        """
+        Args:
+            file (str): Asset file.
+            record (dict): Record of the file in index.
+
+        Returns:
+            bool: If the template in pack is cropped from the current file content.
+                Content is hashed only if file size or mtime differs from the record,
+                such as files touched by git checkout.
+        """
+        try:
+            stat = os.stat(file)
+            if stat.st_size != record['size']:
+                return False
+            if stat.st_mtime_ns == record['mtime']:
+                return True
+            return cls.file_hash(file) == record['sha1']
+        except OSError:
+            return False
+
+    @classmethod
+    def build(cls, buttons):
+        """
+        Args:
+            buttons (list[Button]):
+        """
+        templates = {}
+        offset = 0
+        # Running NKAS may have the pack memory-mapped, truncating it in place crashes them,
+        # so write temp files and replace, index after pack
+        pack_tmp, index_tmp = f'{cls.FILE}.tmp', f'{cls.INDEX}.tmp'
+        with open(pack_tmp, 'wb') as f:
+            for button in buttons:
+                if not button.file or button.file in templates or not os.path.exists(button.file):
+                    continue
+                button.ensure_template()
+                images = button.image if isinstance(button.image, list) else [button.image]
+                frames = []
+                for image in images:
+                    image = np.ascontiguousarray(image, dtype=np.uint8)
+                    f.write(image.tobytes())
+                    frames.append({'offset': offset, 'shape': list(image.shape)})
+                    offset += image.nbytes
+                stat = os.stat(button.file)
+                templates[button.file] = {
+                    'area': [int(i) for i in button.area],
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'sha1': cls.file_hash(button.file),
+                    'frames': frames,
+                }
+        with open(index_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': cls.VERSION, 'size': offset, 'templates': templates}, f, indent=1)
+        os.replace(pack_tmp, cls.FILE)
+        os.replace(index_tmp, cls.INDEX)
+
+        logger.info(f'Template pack: {len(templates)} templates, {offset / 1024 / 1024:.2f} MB')
+        cls.data = None
+        cls.index = {}
+        cls._loaded = False
@@ -1,5 +1,8 @@
 import copy
-import operator
+import heapq
+import itertools
+import os
+import time
 from datetime import datetime, timedelta
 
 from module.base.filter import Filter
@@ -8,7 +11,7 @@ from module.config.config_generated import GeneratedConfig
 from module.config.config_updater import ConfigUpdater
 from module.config.manual_config import ManualConfig
 from module.config.utils import deep_get, DEFAULT_TIME, deep_set, filepath_config, path_to_arg, dict_to_kv, \
-    get_server_next_update, nearest_future
+    get_server_next_update, nearest_future, json_dumps
 from module.config.watcher import ConfigWatcher
 from module.exception import ScriptError, RequestHumanTakeover
 from module.logger import logger
@@ -54,7 +57,116 @@ def name_to_function(name):
     return function
 
 
+class TaskIndex:
+    def __init__(self, priority):
+        """
+        Enabled tasks in a heap ordered by next run and priority,
+        updated per task when its Scheduler changes instead of rebuilding all Functions on every query.
+
+        Args:
+            priority (str): Such as SCHEDULER_PRIORITY, tasks not in it are never scheduled.
+        """
+        self.filter = Filter(regex=r"(.*)", attr=["command"])
+        self.filter.load(priority)
+        # command -> index in priority, None if not in priority
+        self.ranks = {}
+        # (next_run, rank, sequence, task, Function), outdated entries are skipped and dropped lazily
+        self.heap = []
+        self.sequence = itertools.count()
+        # task -> current heap entry
+        self.entries = {}
+        # task -> Function, enabled tasks whose NextRun is not a datetime
+        self.error = {}
+        # task -> position in config data, error tasks are listed in this order
+        self.order = {}
+
+    def rank(self, func):
+        """
+        Args:
+            func (Function):
+
+        Returns:
+            int: Index of the first priority filter matching this task, None if not matched.
+        """
+        if func.command not in self.ranks:
+            self.ranks[func.command] = None
+            for index, (raw, f) in enumerate(zip(self.filter.filter_raw, self.filter.filter)):
+                if not self.filter.is_preset(raw) and self.filter.apply_filter_to_obj(obj=func, filter=f):
+                    self.ranks[func.command] = index
+                    break
+        return self.ranks[func.command]
+
+    def rebuild(self, data):
+        """
+        Args:
+            data (dict): Config data.
+        """
+        self.heap = []
+        self.entries = {}
+        self.error = {}
+        self.order = {task: index for index, task in enumerate(data)}
+        for task, task_data in data.items():
+            self._set(task, task_data)
+        self.heap = list(self.entries.values())
+        heapq.heapify(self.heap)
+
+    def update(self, task, task_data):
+        """
+        Call after Scheduler.Enable or Scheduler.NextRun of a task changed.
+
+        Args:
+            task (str):
+            task_data (dict): Config data of the task.
+        """
+        entry = self._set(task, task_data)
+        if entry is not None:
+            heapq.heappush(self.heap, entry)
+        if len(self.heap) > 2 * len(self.entries) + 16:
+            self.heap = list(self.entries.values())
+            heapq.heapify(self.heap)
+
+    def _set(self, task, task_data):
+        self.entries.pop(task, None)
+        self.error.pop(task, None)
+        func = Function(task_data)
+        if not func.enable:
+            return None
+        if not isinstance(func.next_run, datetime):
+            self.error[task] = func
+            return None
+        rank = self.rank(func)
+        if rank is None:
+            return None
+        entry = (func.next_run, rank, next(self.sequence), task, func)
+        self.entries[task] = entry
+        return entry
+
+    def split(self, now):
+        """
+        Args:
+            now (datetime):
+
+        Returns:
+            list[Function], list[Function]: Pending tasks in priority order, with error tasks first,
+                and waiting tasks ordered by next run then priority.
+        """
+        pending = []
+        while self.heap and self.heap[0][0] < now:
+            entry = heapq.heappop(self.heap)
+            if self.entries.get(entry[3]) is entry:
+                pending.append(entry)
+        for entry in pending:
+            heapq.heappush(self.heap, entry)
+        pending = [entry[4] for entry in sorted(pending, key=lambda e: e[1])]
+        waiting = [entry[4] for entry in sorted(self.entries.values()) if entry[0] >= now]
+        error = [self.error[task] for task in sorted(self.error, key=lambda t: self.order.get(t, len(self.order)))]
+        return error + pending, waiting
+
+
 class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
+    # Seconds to hold saved modifications in write behind mode before writing them
+    WRITE_WINDOW = 30
+
     def __init__(self, config_name, task=None):
         self.config_name = config_name
         self.data = {}
@@ -64,6 +176,15 @@ class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
         self.overridden = {}
         self.pending_task = []
         self.waiting_task = []
+        self.task_index = TaskIndex(self.SCHEDULER_PRIORITY)
+        # (mtime, size) of the config file when self.data was read or written
+        self.file_stat = None
+        # Saved into self.data but not written to file yet, path -> value
+        self.dirty = {}
+        # Time of the oldest dirty path
+        self.dirty_time = 0.
+        # If True, save() keeps modifications in memory until flush(), such as during a task
+        self.write_behind = False
         self.task: Function
         self.is_template_config = config_name == "template"
 
@@ -92,9 +213,33 @@ class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
 
     def load(self):
         self.data = self.read_file(self.config_name)
+        self.file_stat = self.get_file_stat()
         self.config_override()
+        # Saved modifications not written yet are kept over reloads
+        for path, value in self.dirty.items():
+            deep_set(self.data, keys=path, value=value)
         for path, value in self.modified.items():
             deep_set(self.data, keys=path, value=value)
+        self.task_index.rebuild(self.data)
+
+    def get_file_stat(self):
+        """
+        Returns:
+            tuple: (mtime_ns, size) of the config file, None if not exists.
+        """
+        try:
+            stat = os.stat(filepath_config(self.config_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def task_index_update(self, paths):
+        """
+        Args:
+            paths (iterable[str]): Modified paths, such as `Reward.Scheduler.NextRun`
+        """
+        for task in {path.split('.', 1)[0] for path in paths if '.Scheduler.' in path}:
+            self.task_index.update(task, self.data.get(task, {}))
 
     def bind(self, func, func_set=None):
         """
@@ -140,16 +285,70 @@ class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
 
         for path, value in self.modified.items():
             deep_set(self.data, keys=path, value=value)
+        self.task_index_update(self.modified)
 
         logger.info(
             f"Save config {filepath_config(self.config_name, mod_name)}, {dict_to_kv(self.modified)}"
         )
+        if not self.dirty:
+            self.dirty_time = time.time()
+        self.dirty.update(self.modified)
         # Don't use self.modified = {}, that will create a new object.
         self.modified.clear()
+        if not self.write_behind or time.time() - self.dirty_time > self.WRITE_WINDOW:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Write saved modifications to the config file.
+        Writing is skipped if the content doesn't change, such as saving the same values again.
+
+        Returns:
+            bool: If config file written.
+        """
+        if not self.dirty:
+            return False
+        # Config file may be modified by others during write behind, such as GUI,
+        # write dirty paths on top of their changes instead of overwriting them
+        self.reload_if_changed()
+        self.dirty.clear()
+        content = json_dumps(self.data)
+        if content == self.read_file_content():
+            return False
+
+        # Only skip the next reload if nobody else wrote the file since we read it
+        unchanged = self.file_stat == self.get_file_stat()
         self.write_file(self.config_name, data=self.data)
+        self.file_stat = self.get_file_stat() if unchanged else None
+        return True
 
-    def update(self):
+    def read_file_content(self):
+        """
+        Returns:
+            str: Raw content of the config file, None if failed to read.
+        """
+        try:
+            with open(filepath_config(self.config_name), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def reload_if_changed(self):
+        """
+        Reload config file if it was modified by others, such as GUI.
+        Saved modifications not written yet are applied again after reload.
+
+        Returns:
+            bool: If reloaded.
+        """
+        if self.file_stat is not None and self.file_stat == self.get_file_stat():
+            return False
         self.load()
+        return True
+
+    def update(self):
+        self.reload_if_changed()
         self.config_override()
         self.bind(self.task)
         self.save()
@@ -168,6 +367,7 @@ class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
                 )
                 if isinstance(next_run, datetime) and next_run > limit:
                     deep_set(self.data, keys=f"{task}.Scheduler.NextRun", value=now)
+                    self.task_index.update(task, self.data.get(task, {}))
 
         for task in ["Reward"]:
             if not self.is_task_enabled(task):
@@ -218,73 +418,12 @@ class NikkeConfig(ConfigUpdater, ManualConfig, GeneratedConfig, ConfigWatcher):
             raise RequestHumanTakeover
 
     def get_next_task(self):
-        pending = []
-        waiting = []
-        error = []
-        now = datetime.now()
-
-        # func 为json中的任务属性
-        '''
-        {
-            'Scheduler': 
-                {
-                    'Enable': True, 
-                    'NextRun': datetime.datetime(1989, 12, 27, 0, 0),
-                    'Command': 'Restart',         
-                    'SuccessInterval': 0,
-                    'FailureInterval': 0, 
-                    'ServerUpdate': '04:00'
-                 },  
-            'Storage': 
-                {
-                    'Storage': {}
-                }
-        } 
-        
-        Reward (Enable, 1989-12-27 00:00:00)
-        '''
-        for func in self.data.values():
-            func = Function(func)
-            '''
-                跳过Scheduler.Enable为False的任务
-            '''
-            if not func.enable:
-                continue
-            '''
-                从配置中获取的运行时间格式错误
-            '''
-            if not isinstance(func.next_run, datetime):
-                error.append(func)
-
-            elif func.next_run < now:
-                '''
-                    当前时间 > 该任务的下次运行时间
-                '''
-                pending.append(func)
-            else:
-                waiting.append(func)
-
-        '''
-            任务优先级
-        '''
-        f = Filter(regex=r"(.*)", attr=["command"])
-        f.load(self.SCHEDULER_PRIORITY)
-        if pending:
-            '''
-                待执行队列不进行排序，因为会影响到重启任务
-            '''
-            pending = f.apply(pending)
-        if waiting:
-            '''
-                等待队列按运行时间排序显示
-            '''
-            waiting = f.apply(waiting)
-            waiting = sorted(waiting, key=operator.attrgetter("next_run"))
-        if error:
-            pending = error + pending
-
-        self.pending_task = pending
-        self.waiting_task = waiting
+        """
+            任务优先级见 SCHEDULER_PRIORITY
+            待执行队列按优先级排列，不按运行时间排序，因为会影响到重启任务
+            等待队列按运行时间排序
+        """
+        self.pending_task, self.waiting_task = self.task_index.split(datetime.now())
 
     def is_task_enabled(self, task):
         return bool(self.cross_get(keys=[task, 'Scheduler', 'Enable'], default=False))
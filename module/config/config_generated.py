@@ -20,16 +20,24 @@ class GeneratedConfig:
     # Group `Emulator`
     Emulator_Serial = 'auto'
     Emulator_PackageName = 'com_proximabeta_nikke'  # com_proximabeta_nikke, com_gamamobi_nikke
-    Emulator_ScreenshotMethod = 'DroidCast'  # DroidCast, ADB
+    Emulator_ScreenshotMethod = 'DroidCast'  # DroidCast, ADB, ADB_stream
     Emulator_ControlMethod = 'minitouch'  # minitouch, ADB
     Emulator_AdbRestart = False
     Emulator_ScreenshotInterval = 0.5
+    Emulator_ScreenshotAdaptive = False
+    Emulator_ScreenshotIntervalMin = 0.5
+    Emulator_ScreenshotIntervalMax = 1.5
+    Emulator_ScreenshotPrefetch = False
     Emulator_AppStartClickX = 250
     Emulator_AppStartClickY = 615
     Emulator_ScheduleOffset = 0
 
     # Group `Optimization`
     Optimization_WhenTaskQueueEmpty = 'goto_main'  # stay_there, goto_main, close_game
+    Optimization_OcrServer = False
+    Optimization_OcrPreload = True
+    Optimization_OcrBackend = 'pytorch'  # pytorch, onnx, onnx_int8
+    Optimization_OcrThreads = 0
 
     # Group `Reward`
     Reward_CollectSocialPoint = True
@@ -43,6 +51,10 @@ class GeneratedConfig:
     # Group `Overcome`
     Overcome_OnlyToCompleteDailyMission = False
 
+    # Group `ScreenshotPace`
+    ScreenshotPace_IntervalMin = 0.3
+    ScreenshotPace_IntervalMax = 1.5
+
     # Group `GeneralShop`
     GeneralShop_enable = True
 
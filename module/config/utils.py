@@ -214,6 +214,17 @@ def dict_to_kv(dictionary, allow_none=True):
     return ', '.join([f'{k}={repr(v)}' for k, v in dictionary.items() if allow_none or v is not None])
 
 
+def json_dumps(data):
+    """
+    Args:
+        data (dict, list):
+
+    Returns:
+        str: Content that write_file() writes to .json files.
+    """
+    return json.dumps(data, indent=2, ensure_ascii=False, sort_keys=False, default=str)
+
+
 def write_file(file, data):
     """
     Write data into a file, supports both .yaml and .json format.
@@ -240,8 +251,7 @@ def write_file(file, data):
                                    sort_keys=False)
         elif ext == '.json':
             with atomic_write(file, overwrite=True, encoding='utf-8', newline='') as f:
-                s = json.dumps(data, indent=2, ensure_ascii=False, sort_keys=False, default=str)
-                f.write(s)
+                f.write(json_dumps(data))
         else:
             print(f'Unsupported config file extension: {ext}')
 
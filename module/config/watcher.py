@@ -1,4 +1,5 @@
 import os
+import threading
 from datetime import datetime
 
 from module.config.utils import DEFAULT_TIME, filepath_config
@@ -8,8 +9,18 @@ from module.logger import logger
 class ConfigWatcher:
     config_name = 'nkas'
     start_mtime = DEFAULT_TIME
+    # Seconds between mtime checks if file notifications are unavailable
+    WATCH_INTERVAL = 5
+
+    # Set on config file changes and explicit wakeups, shared by the process
+    wakeup = threading.Event()
+    # watchdog observer, None if not started, False if unavailable
+    _observer = None
 
     def start_watching(self) -> None:
+        # Watch before reading mtime, so changes after the mtime read always set wakeup
+        self.observe()
+        self.wakeup.clear()
         self.start_mtime = self.get_mtime()
 
     def get_mtime(self) -> datetime:
@@ -17,7 +28,7 @@ class ConfigWatcher:
             Last modify time of the file
         """
         timestamp = os.stat(filepath_config(self.config_name)).st_mtime
-        mtime = datetime.fromtimestamp(timestamp).replace(microsecond=0)
+        mtime = datetime.fromtimestamp(timestamp)
         return mtime
 
     def should_reload(self) -> bool:
@@ -27,7 +38,61 @@ class ConfigWatcher:
         """
         mtime = self.get_mtime()
         if mtime > self.start_mtime:
-            logger.info(f'Config "{self.config_name}" changed at {mtime}')
+            logger.info(f'Config "{self.config_name}" changed at {mtime.replace(microsecond=0)}')
             return True
         else:
             return False
+
+    def observe(self) -> bool:
+        """
+        Watch config file with watchdog, which uses inotify, FSEvents or ReadDirectoryChangesW,
+        and set `wakeup` on changes.
+
+        Returns:
+            bool: If file notifications available, otherwise callers should poll should_reload().
+        """
+        if ConfigWatcher._observer is not None:
+            return bool(ConfigWatcher._observer)
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.info('watchdog not installed, check config changes every '
+                        f'{self.WATCH_INTERVAL}s')
+            ConfigWatcher._observer = False
+            return False
+
+        file = os.path.abspath(filepath_config(self.config_name))
+        wakeup = self.wakeup
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # Config is written by atomic_write, which renames a temp file to it
+                paths = [event.src_path, getattr(event, 'dest_path', '')]
+                if any(path and os.path.abspath(path) == file for path in paths):
+                    wakeup.set()
+
+        try:
+            observer = Observer()
+            observer.daemon = True
+            observer.schedule(Handler(), os.path.dirname(file), recursive=False)
+            observer.start()
+        except Exception as e:
+            logger.warning(f'Failed to watch config file: {e}')
+            ConfigWatcher._observer = False
+            return False
+        ConfigWatcher._observer = observer
+        return True
+
+    def wait_change(self, timeout) -> None:
+        """
+        Block until config file may have changed, wakeup is set, or timeout.
+        Check should_reload() after it.
+
+        Args:
+            timeout (float): Seconds.
+        """
+        if not self.observe():
+            timeout = min(timeout, self.WATCH_INTERVAL)
+        if self.wakeup.wait(timeout=max(timeout, 0)):
+            self.wakeup.clear()
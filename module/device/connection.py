@@ -1,11 +1,13 @@
 import logging
 import re
+import shlex
+import socket
 import subprocess
+import threading
 import time
-from functools import wraps
+from functools import cached_property, wraps
 
-import uiautomator2 as u2
-from adbutils import AdbError, AdbDevice, AdbClient, ForwardItem
+from adbutils import AdbError, AdbDevice, AdbClient, AdbTimeout, ForwardItem
 
 from module.base.decorator import del_cached_property
 from module.base.utils import ensure_time
@@ -80,6 +82,79 @@ class AdbDeviceWithStatus(AdbDevice):
         return True
 
 
+class AdbShellSession:
+    def __init__(self, stream):
+        """
+        A long-living `adb shell sh`, commands are written to its stdin and
+        their outputs are delimited by sentinel lines,
+        so each command costs a round trip instead of a new adb shell exec.
+
+        Args:
+            stream (AdbConnection): Result of adb_shell(['sh'], stream=True, recvall=False)
+        """
+        self.stream = stream
+        self.conn = stream.conn
+        self.buffer = b''
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def execute(self, cmd, timeout=10):
+        """
+        Args:
+            cmd (list, str):
+            timeout (int):
+
+        Returns:
+            str: Output of stdout and stderr, like adb_shell()
+
+        Raises:
+            AdbTimeout: If command didn't finish in time, session is closed.
+            AdbError: If session closed.
+        """
+        if not isinstance(cmd, str):
+            cmd = ' '.join(shlex.quote(str(c)) for c in cmd)
+        with self.lock:
+            self.counter += 1
+            token = f'NKAS{id(self):x}_{self.counter}'
+            # Echoed input on shells with tty has `{token}_S;` and `{token}_E $?`, which don't match
+            start = re.compile(f'{token}_S\r?\n'.encode())
+            end = re.compile(f'{token}_E (\\d+)\r?\n'.encode())
+            # Commands read /dev/null, so they can't consume the following commands
+            line = f'echo {token}_S; {{ {cmd}\n}} </dev/null 2>&1; echo {token}_E $?\n'
+            deadline = time.time() + timeout
+            try:
+                self.conn.sendall(line.encode())
+                while 1:
+                    res = end.search(self.buffer)
+                    if res:
+                        break
+                    self.conn.settimeout(max(deadline - time.time(), 0.001))
+                    chunk = self.conn.recv(4096)
+                    if not chunk:
+                        raise AdbError('adb shell session closed')
+                    self.buffer += chunk
+            except socket.timeout:
+                self.close()
+                raise AdbTimeout('adb shell session read timeout')
+            except OSError as e:
+                self.close()
+                raise AdbError(f'adb shell session closed: {e}')
+
+            data, self.buffer = self.buffer[:res.start()], self.buffer[res.end():]
+            # Output after the start sentinel, drop echoed input and prompts
+            res = start.search(data)
+            if res:
+                data = data[res.end():]
+            result = data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+            return remove_shell_warning(result).rstrip()
+
+    def close(self):
+        try:
+            self.stream.close()
+        except Exception:
+            pass
+
+
 class Connection(ConnectionAttr):
     def __init__(self, config):
         """
@@ -247,6 +322,7 @@ class Connection(ConnectionAttr):
         if msg:
             logger.info(msg)
 
+        self.shell_session_close()
         del_cached_property(self, 'hermit_session')
         del_cached_property(self, 'droidcast_session')
         del_cached_property(self, 'minitouch_builder')
@@ -256,6 +332,7 @@ class Connection(ConnectionAttr):
         """
             当没有设备被找到时，不然重新尝试连接
         """
+        self.shell_session_close()
         self.adb_restart()
         self.adb_connect(self.serial)
         self.detect_device()
@@ -388,6 +465,7 @@ class Connection(ConnectionAttr):
         """
         Init uiautomator2 and remove minicap.
         """
+        import uiautomator2 as u2
         logger.info('Install uiautomator2')
         init = u2.init.Initer(self.adb, loglevel=logging.DEBUG)
         # MuMu X has no ro.product.cpu.abi, pick abi from ro.product.cpu.abilist
@@ -525,6 +603,43 @@ class Connection(ConnectionAttr):
             # str
             return result
 
+    @cached_property
+    def shell_session(self):
+        """
+        Returns:
+            AdbShellSession:
+        """
+        logger.info('Open adb shell session')
+        return AdbShellSession(self.adb_shell(['sh'], stream=True, recvall=False))
+
+    def shell_session_close(self):
+        if 'shell_session' in self.__dict__:
+            self.shell_session.close()
+        del_cached_property(self, 'shell_session')
+
+    def adb_shell_session(self, cmd, timeout=10):
+        """
+        Same as adb_shell(cmd), but run in the persistent shell session.
+        A broken session is re-opened once, and errors after that go to the @retry of callers,
+        which reconnect adb.
+
+        Args:
+            cmd (list, str):
+            timeout (int):
+
+        Returns:
+            str:
+        """
+        try:
+            return self.shell_session.execute(cmd, timeout=timeout)
+        except AdbTimeout:
+            self.shell_session_close()
+            raise
+        except AdbError as e:
+            logger.warning(e)
+            self.shell_session_close()
+        return self.shell_session.execute(cmd, timeout=timeout)
+
     @staticmethod
     def sleep(second):
         """
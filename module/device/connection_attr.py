@@ -1,13 +1,16 @@
 import os
 from functools import cached_property
+from typing import TYPE_CHECKING
 
 import adbutils
-import uiautomator2 as u2
 from adbutils import AdbClient, AdbDevice
 
 from module.config.config import NikkeConfig
 from module.logger import logger
 
+if TYPE_CHECKING:
+    import uiautomator2 as u2
+
 
 class ConnectionAttr:
     config: NikkeConfig
@@ -99,7 +102,8 @@ class ConnectionAttr:
         return AdbDevice(self.adb_client, self.serial)
 
     @cached_property
-    def u2(self) -> u2.Device:
+    def u2(self) -> "u2.Device":
+        import uiautomator2 as u2
 
         if self.serial.startswith('emulator-') or self.serial.startswith('127.0.0.1:'):
             device = u2.connect_usb(self.serial)
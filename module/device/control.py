@@ -1,3 +1,4 @@
+import time
 from functools import cached_property
 
 import numpy as np
@@ -44,10 +45,14 @@ class Control(ControlMultiInheritance):
         if method == 'minitouch':
             # Use the original minitouch implementation
             from module.device.method import minitouch
-            return minitouch.Minitouch.click_minitouch(self, x, y)
+            result = minitouch.Minitouch.click_minitouch(self, x, y)
+            self.control_timestamp = time.time()
+            return result
         elif method == 'ADB':
             # Use ADB click
-            return self.click_adb(x, y)
+            result = self.click_adb(x, y)
+            self.control_timestamp = time.time()
+            return result
         else:
             # Fallback - create a button and use generic click
             from module.base.button import Button
@@ -67,10 +72,14 @@ class Control(ControlMultiInheritance):
         if method == 'minitouch':
             # Use the original minitouch implementation
             from module.device.method import minitouch
-            return minitouch.Minitouch.swipe_minitouch(self, p1, p2)
+            result = minitouch.Minitouch.swipe_minitouch(self, p1, p2)
+            self.control_timestamp = time.time()
+            return result
         elif method == 'ADB':
             # Use ADB swipe
-            return self.swipe_adb(p1, p2)
+            result = self.swipe_adb(p1, p2)
+            self.control_timestamp = time.time()
+            return result
         else:
             # Fallback to generic swipe
             return self.swipe(p1, p2)
@@ -111,6 +120,7 @@ class Control(ControlMultiInheritance):
         method = self.click_methods.get(
             self.config.Emulator_ControlMethod)
         method(x, y)
+        self.control_timestamp = time.time()
 
     def swipe(self, p1, p2, name='SWIPE', label='Swipe', distance_check=True, handle_control_check=True):
         if handle_control_check:
@@ -130,3 +140,4 @@ class Control(ControlMultiInheritance):
             self.swipe_minitouch(p1, p2)
         elif method == 'ADB':
             self.swipe_adb(p1, p2)
+        self.control_timestamp = time.time()
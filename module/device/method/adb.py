@@ -1,14 +1,25 @@
+import socket
+from functools import cached_property
+
 import cv2
 import numpy as np
-from functools import wraps
+from adbutils import AdbTimeout
 
+from module.base.decorator import del_cached_property
 from module.device.connection import Connection, retry
-from module.device.method.utils import ImageTruncated
-from module.exception import RequestHumanTakeover
+from module.device.method.utils import ImageTruncated, remove_shell_warning
 from module.logger import logger
 
 
 class Adb(Connection):
+    # Output of `screencap` is a header followed by RGBA pixels.
+    # Header is (width, height, format) in 12 bytes, with an extra colorspace since Android 9.
+    _screencap_header_size = 0
+    _screencap_shape = None
+    _screencap_buffer = None
+    # Printed after each frame to mark the frame boundary
+    SCREENCAP_END = b'__NKAS_SCREENCAP_END__\n'
+
     @retry
     def screenshot_adb(self):
         """
@@ -43,3 +54,130 @@ class Adb(Connection):
         # it's already converted to RGB (3 channels), discarding the alpha channel
         
         return image
+
+    @cached_property
+    def screencap_stream(self):
+        """
+        A long-lived `sh` on device, opened through the adb `exec:` service,
+        which passes binary output untouched and accepts commands from stdin.
+        Screenshots are requested one at a time, so device never produces frames we don't read.
+
+        Returns:
+            AdbConnection:
+        """
+        logger.info('Open screencap stream')
+        stream = self.adb.open_transport()
+        stream.send_command('exec:sh')
+        stream.check_okay()
+        stream.conn.settimeout(10)
+        return stream
+
+    def screencap_stream_close(self):
+        """
+        Close screencap stream if opened, the next screenshot_adb_stream() reopens it
+        and detects the frame header again.
+        """
+        stream = self.__dict__.get('screencap_stream')
+        if stream is not None:
+            logger.info('Close screencap stream')
+            try:
+                stream.close()
+            except Exception as e:
+                logger.warning(e)
+        del_cached_property(self, 'screencap_stream')
+        self._screencap_header_size = 0
+        self._screencap_buffer = None
+
+    def _screencap_request(self):
+        # `exec:` sends stderr down the same socket, drop warnings like `WARNING: linker: ...`
+        # printed by every screencap, otherwise they break frame boundaries
+        self.screencap_stream.send(b'screencap 2>/dev/null; echo "' + self.SCREENCAP_END.strip() + b'"\n')
+
+    def adb_disconnect(self, serial):
+        # Close socket and reset frame header of the screencap stream
+        self.screencap_stream_close()
+        super().adb_disconnect(serial)
+
+    def _screencap_first_frame(self):
+        """
+        Receive the first frame until the end mark, to learn header size and resolution.
+
+        Returns:
+            bytes: Header and pixels.
+        """
+        conn = self.screencap_stream.conn
+        fragments = []
+        tail = b''
+        while 1:
+            chunk = conn.recv(65536)
+            if not chunk:
+                raise ImageTruncated('Screencap stream closed')
+            fragments.append(chunk)
+            tail = (tail + chunk)[-len(self.SCREENCAP_END):]
+            if tail == self.SCREENCAP_END:
+                break
+        data = remove_shell_warning(b''.join(fragments))[:-len(self.SCREENCAP_END)]
+
+        width, height = np.frombuffer(data, dtype=np.uint32, count=2)
+        header_size = len(data) - int(width) * int(height) * 4
+        if header_size not in (12, 16):
+            raise ImageTruncated(f'Unexpected screencap output, size={len(data)}, width={width}, height={height}')
+        logger.attr('ScreencapStream', f'{width}x{height}, header={header_size}')
+        self._screencap_header_size = header_size
+        self._screencap_shape = (int(height), int(width), 4)
+        return data
+
+    def _screencap_next_frame(self):
+        """
+        Receive a frame of known size into the reused buffer.
+
+        Returns:
+            memoryview: Header and pixels.
+        """
+        height, width, channel = self._screencap_shape
+        size = self._screencap_header_size + height * width * channel
+        total = size + len(self.SCREENCAP_END)
+        if self._screencap_buffer is None or len(self._screencap_buffer) != total:
+            self._screencap_buffer = bytearray(total)
+        view = memoryview(self._screencap_buffer)
+
+        conn = self.screencap_stream.conn
+        received = 0
+        while received < total:
+            n = conn.recv_into(view[received:], total - received)
+            if not n:
+                raise ImageTruncated('Screencap stream closed')
+            received += n
+        if bytes(view[size:]) != self.SCREENCAP_END:
+            raise ImageTruncated('Screencap stream lost frame boundary')
+        return view[:size]
+
+    @retry
+    def screenshot_adb_stream(self):
+        """
+        Take a screenshot through a persistent screencap stream.
+        Raw RGBA frames are transferred, skipping PNG encoding on device and decoding here,
+        which costs 150~300ms per frame on the `screencap -p` path.
+
+        Returns:
+            np.ndarray: Screenshot in RGB format (720x1280x3)
+        """
+        try:
+            self._screencap_request()
+            if self._screencap_header_size:
+                data = self._screencap_next_frame()
+            else:
+                data = self._screencap_first_frame()
+        except socket.timeout:
+            self.screencap_stream_close()
+            raise AdbTimeout('Screencap stream read timeout')
+        except Exception:
+            # Stream is unusable after a partial read, reopen it on retry
+            self.screencap_stream_close()
+            raise
+
+        image = np.frombuffer(data, dtype=np.uint8, offset=self._screencap_header_size)
+        image = image.reshape(self._screencap_shape)
+        # Creates a new array, the receive buffer can be reused
+        image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+        return image
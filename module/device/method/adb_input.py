@@ -68,9 +68,8 @@ class AdbInput(Connection):
         """
         x, y = ensure_int(x, y)
         cmd = ['input', 'tap', str(x), str(y)]
-        self.adb_shell(cmd)
-        # Small delay to ensure click is registered
-        time.sleep(0.05)
+        # Session returns after `input` exits, when the tap is already injected
+        self.adb_shell_session(cmd)
     
     @retry
     def swipe_adb(self, p1, p2, duration=200):
@@ -85,7 +84,7 @@ class AdbInput(Connection):
         x1, y1 = ensure_int(p1[0], p1[1])
         x2, y2 = ensure_int(p2[0], p2[1])
         cmd = ['input', 'swipe', str(x1), str(y1), str(x2), str(y2), str(duration)]
-        self.adb_shell(cmd)
+        self.adb_shell_session(cmd)
         # Small delay after swipe
         time.sleep(0.05)
     
@@ -103,7 +102,7 @@ class AdbInput(Connection):
         x1, y1 = ensure_int(p1[0], p1[1])
         x2, y2 = ensure_int(p2[0], p2[1])
         cmd = ['input', 'swipe', str(x1), str(y1), str(x2), str(y2), str(duration)]
-        self.adb_shell(cmd)
+        self.adb_shell_session(cmd)
         # Longer delay after drag
         time.sleep(0.5)
     
@@ -116,7 +115,7 @@ class AdbInput(Connection):
             str: Package name of current foreground app
         """
         # Get the current focused app
-        result = self.adb_shell(['dumpsys', 'window', 'windows'], timeout=10)
+        result = self.adb_shell_session(['dumpsys', 'window', 'windows'], timeout=10)
         
         # Look for mCurrentFocus or mFocusedApp
         import re
@@ -150,7 +149,7 @@ class AdbInput(Connection):
             
         # Use am start to launch the MainActivity
         cmd = ['am', 'start', '-n', f'{package_name}/com.shiftup.nk.MainActivity']
-        result = self.adb_shell(cmd)
+        result = self.adb_shell_session(cmd)
         
         # Small delay to let the app start
         time.sleep(1)
@@ -181,7 +180,7 @@ class AdbInput(Connection):
             package_name = self.package
             
         cmd = ['am', 'force-stop', package_name]
-        self.adb_shell(cmd)
+        self.adb_shell_session(cmd)
         
         # Small delay after stopping
         time.sleep(0.5)
\ No newline at end of file
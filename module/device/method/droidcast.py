@@ -18,6 +18,80 @@ class DroidCastVersionIncompatible(Exception):
     pass
 
 
+class Rgb565Decoder:
+    def __init__(self, shape=(1280, 720), buffers=2, use_lut=False):
+        """
+        Convert RGB565 bitmaps to RGB888 images, writing into preallocated buffers.
+
+        Args:
+            shape (tuple): (height, width)
+            buffers (int): Amount of output buffers used in turn.
+                With 2, the previous image stays valid while decoding the next one.
+                With 0, allocate a new output image on every call, intermediate buffers are still reused.
+            use_lut (bool): Decode through a 65536 entries lookup table instead of bitwise operations.
+                Costs about 6ms instead of 3ms on CPUs with SIMD, but may be faster on low-end CPUs.
+        """
+        self.shape = shape
+        self.use_lut = use_lut
+        self._channel = np.empty(shape, dtype=np.uint16)
+        self._r = np.empty(shape, dtype=np.uint8)
+        self._g = np.empty(shape, dtype=np.uint8)
+        self._b = np.empty(shape, dtype=np.uint8)
+        self._m = np.empty(shape, dtype=np.uint8)
+        self._outputs = [np.empty((*shape, 3), dtype=np.uint8) for _ in range(buffers)]
+        self._index = 0
+
+    @cached_property
+    def lut(self):
+        """
+        Returns:
+            np.ndarray: Shape (65536, 3), RGB888 of each RGB565 value.
+        """
+        decoder = Rgb565Decoder(shape=(256, 256), buffers=1)
+        return decoder.decode(np.arange(65536, dtype=np.uint16).reshape(256, 256)).reshape(65536, 3).copy()
+
+    def _next_output(self):
+        if not self._outputs:
+            return np.empty((*self.shape, 3), dtype=np.uint8)
+        output = self._outputs[self._index]
+        self._index = (self._index + 1) % len(self._outputs)
+        return output
+
+    def decode(self, arr):
+        """
+        Args:
+            arr (np.ndarray): RGB565 bitmap in uint16, shape (height, width).
+
+        Returns:
+            np.ndarray: RGB888 image, shape (height, width, 3).
+                Output buffers are reused, copy the image if it needs to outlive the next `buffers` calls.
+        """
+        output = self._next_output()
+        if self.use_lut:
+            return np.take(self.lut, arr, axis=0, out=output)
+
+        # The same as the bit shifting in screenshot_droidcast_raw() but costs about 3~4ms instead of 10ms.
+        # Note that cv2.convertScaleAbs is 5x fast as cv2.multiply, cv2.add is 8x fast as cv2.convertScaleAbs
+        # Note that cv2.convertScaleAbs includes rounding
+        channel, r, g, b, m = self._channel, self._r, self._g, self._b, self._m
+        cv2.bitwise_and(arr, 0b1111100000000000, dst=channel)
+        cv2.convertScaleAbs(channel, dst=r, alpha=0.00390625)
+        cv2.convertScaleAbs(r, dst=m, alpha=0.03125)
+        cv2.add(r, m, dst=r)
+
+        cv2.bitwise_and(arr, 0b0000011111100000, dst=channel)
+        cv2.convertScaleAbs(channel, dst=g, alpha=0.125)
+        cv2.convertScaleAbs(g, dst=m, alpha=0.015625)
+        cv2.add(g, m, dst=g)
+
+        cv2.bitwise_and(arr, 0b0000000000011111, dst=channel)
+        cv2.convertScaleAbs(channel, dst=b, alpha=8)
+        cv2.convertScaleAbs(b, dst=m, alpha=0.03125)
+        cv2.add(b, m, dst=b)
+
+        return cv2.merge([r, g, b], dst=output)
+
+
 def retry(func):
     @wraps(func)
     def retry_wrapper(self, *args, **kwargs):
@@ -96,6 +170,12 @@ class DroidCast(Uiautomator2):
         self._droidcast_port = self.adb_forward('tcp:53516')
         return session
 
+    @cached_property
+    def droidcast_decoder(self):
+        # Screenshots are kept by the prefetch thread, so don't reuse output buffers
+        buffers = 0 if self.config.Emulator_ScreenshotPrefetch else 2
+        return Rgb565Decoder(shape=(1280, 720), buffers=buffers)
+
     def droidcast_url(self, url='/screenshot?format=png'):
         """
         Check APIs from source code:
@@ -200,27 +280,7 @@ class DroidCast(Uiautomator2):
         # b = b.astype(np.uint8)
         # image = cv2.merge([r, g, b])
 
-        # The same as the code above but costs about 3~4ms instead of 10ms.
-        # Note that cv2.convertScaleAbs is 5x fast as cv2.multiply, cv2.add is 8x fast as cv2.convertScaleAbs
-        # Note that cv2.convertScaleAbs includes rounding
-        r = cv2.bitwise_and(arr, 0b1111100000000000)
-        r = cv2.convertScaleAbs(r, alpha=0.00390625)
-        m = cv2.convertScaleAbs(r, alpha=0.03125)
-        cv2.add(r, m, dst=r)
-
-        g = cv2.bitwise_and(arr, 0b0000011111100000)
-        g = cv2.convertScaleAbs(g, alpha=0.125)
-        m = cv2.convertScaleAbs(g, alpha=0.015625, dst=m)
-        cv2.add(g, m, dst=g)
-
-        b = cv2.bitwise_and(arr, 0b0000000000011111)
-        b = cv2.convertScaleAbs(b, alpha=8)
-        m = cv2.convertScaleAbs(b, alpha=0.03125, dst=m)
-        cv2.add(b, m, dst=b)
-
-        image = cv2.merge([r, g, b])
-
-        return image
+        return self.droidcast_decoder.decode(arr)
 
     @retry
     def screenshot_droidcast(self):
@@ -4,7 +4,6 @@ from functools import wraps
 from json import JSONDecodeError
 from subprocess import list2cmdline
 
-import uiautomator2 as u2
 from adbutils import AdbError
 
 from module.device.connection import Connection
@@ -190,6 +189,7 @@ class Uiautomator2(Connection):
 
     @retry
     def app_start_uiautomator2(self, package_name=None):
+        import uiautomator2 as u2
         if not package_name:
             package_name = self.package
         try:
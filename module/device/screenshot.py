@@ -1,39 +1,243 @@
+import threading
+import time
 from collections import deque
 from datetime import datetime
 from functools import cached_property
 
+from module.base.frame import Frame, FrameDeque
 from module.base.timer import Timer
 from module.base.utils import image_size
 from module.device.method.droidcast import DroidCast
 from module.device.method.adb import Adb
+from module.logger import logger
 
 
 class ScreenshotSizeError(Exception):
     pass
 
 
+class ScreenshotPacer:
+    """
+    Adaptive interval between screenshots.
+    Interval drops to minimum after clicks and when screen changes,
+    and grows exponentially to maximum while screen stays unchanged, such as loading and waiting.
+
+    Has the same wait() and reset() as Timer, so it can replace the fixed screenshot interval.
+    """
+    # Multiply interval by this on each unchanged frame
+    BACKOFF = 1.5
+    # Seconds after a click or swipe to keep the minimum interval, waiting for the game to respond
+    CONTROL_WINDOW = 1.0
+    # Screen is considered changed if more than this ratio of tiles changed, ignoring small idle animations
+    CHANGE_RATIO = 0.02
+
+    def __init__(self, minimum, maximum):
+        """
+        Args:
+            minimum (float): Interval after clicks and when screen changes.
+            maximum (float): Interval limit while screen stays unchanged.
+        """
+        self.default = (minimum, maximum)
+        self.minimum, self.maximum = minimum, maximum
+        self.interval = minimum
+        self.control_timestamp = 0.
+        self.frame_id = None
+        self._current = 0.
+        # Wakes up wait() when interval is shortened
+        self._wake = threading.Event()
+
+    def set_profile(self, minimum=None, maximum=None):
+        """
+        Args:
+            minimum (float): Interval of the current task, None or 0 to use user settings.
+            maximum (float):
+        """
+        self.minimum = float(minimum or self.default[0])
+        self.maximum = float(maximum or self.default[1])
+        self.interval = self.minimum
+        logger.attr('ScreenshotInterval', f'{self.minimum}s ~ {self.maximum}s')
+
+    def reset(self):
+        self._current = time.time()
+        return self
+
+    def wait(self):
+        while 1:
+            diff = self._current + self.interval - time.time()
+            if diff <= 0:
+                return
+            if self._wake.wait(timeout=diff):
+                self._wake.clear()
+
+    def on_control(self, timestamp):
+        """
+        Args:
+            timestamp (float): Time of the click or swipe.
+        """
+        self.control_timestamp = timestamp
+        self.interval = self.minimum
+        self._wake.set()
+
+    def on_frame(self, frame_id):
+        """
+        Args:
+            frame_id (int): Result of Frame.update() on the new screenshot.
+        """
+        if self.frame_id is None or frame_id == self.frame_id:
+            changed = False
+        else:
+            changed = Frame.changed_tiles(since=self.frame_id).mean() > self.CHANGE_RATIO
+        self.frame_id = frame_id
+        if changed or time.time() - self.control_timestamp < self.CONTROL_WINDOW:
+            self.interval = self.minimum
+        else:
+            self.interval = min(max(self.interval, self.minimum) * self.BACKOFF, self.maximum)
+
+
+class ScreenshotPrefetch:
+    def __init__(self, grab, interval, length=3):
+        """
+        Pull screenshots continuously in a background thread,
+        so that screenshot transport and decoding overlap with image processing.
+
+        Args:
+            grab (callable): Function to take a screenshot, returns np.ndarray.
+            interval (float, Timer, ScreenshotPacer): Minimum interval between two screenshots.
+            length (int): Amount of frames to keep.
+        """
+        self.grab = grab
+        self.interval = interval if hasattr(interval, 'wait') else Timer(interval)
+        # (timestamp when screenshot started, image)
+        self.frames = deque(maxlen=length)
+        self.condition = threading.Condition()
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        logger.info('Screenshot prefetch start')
+        self.error = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='ScreenshotPrefetch', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.is_running:
+            return
+        logger.info('Screenshot prefetch stop')
+        self.stop_event.set()
+        self.thread.join(timeout=10)
+        self.thread = None
+        with self.condition:
+            self.frames.clear()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.interval.wait()
+            self.interval.reset()
+            timestamp = time.time()
+            try:
+                image = self.grab()
+            except BaseException as e:
+                # Re-raised in the thread who requests screenshots
+                with self.condition:
+                    self.error = e
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.frames.append((timestamp, image))
+                self.condition.notify_all()
+
+    def get(self, newer_than=0.):
+        """
+        Args:
+            newer_than (float): Timestamp, the returned screenshot must be taken after it.
+
+        Returns:
+            float, np.ndarray: Timestamp and image of the freshest screenshot.
+        """
+        with self.condition:
+            while 1:
+                if self.error is not None:
+                    error, self.error = self.error, None
+                    raise error
+                if self.frames and self.frames[-1][0] > newer_than:
+                    return self.frames[-1]
+                if not self.is_running:
+                    self.start()
+                self.condition.wait(timeout=1)
+
+
 class ScreenshotMultiInheritance(DroidCast, Adb):
     """Multiple inheritance to get all screenshot methods"""
     pass
 
 
 class Screenshot(ScreenshotMultiInheritance):
+    # Timestamp of the last click or swipe, screenshots taken before it are outdated
+    control_timestamp = 0.
+    # Timestamp of the last screenshot
+    screenshot_timestamp = 0.
+
     def __init__(self, config):
         super().__init__(config)
-        self._screenshot_interval = Timer(
-            float(self.config.Emulator_ScreenshotInterval)
-        )
+        if self.config.Emulator_ScreenshotAdaptive:
+            self._screenshot_pacer = ScreenshotPacer(
+                minimum=float(self.config.Emulator_ScreenshotIntervalMin),
+                maximum=float(self.config.Emulator_ScreenshotIntervalMax),
+            )
+            self._screenshot_interval = self._screenshot_pacer
+        else:
+            self._screenshot_pacer = None
+            self._screenshot_interval = Timer(
+                float(self.config.Emulator_ScreenshotInterval)
+            )
 
     @cached_property
     def screenshot_methods(self):
         return {
             "DroidCast": self.screenshot_droidcast_raw,
             "ADB": self.screenshot_adb,
+            "ADB_stream": self.screenshot_adb_stream,
         }
 
     @cached_property
     def screenshot_deque(self):
-        return deque(maxlen=int(self.config.Error_ScreenshotLength))
+        return FrameDeque(maxlen=int(self.config.Error_ScreenshotLength))
+
+    @cached_property
+    def screenshot_prefetch(self):
+        def grab():
+            method = self.screenshot_methods.get(self.config.Emulator_ScreenshotMethod)
+            return method()
+
+        return ScreenshotPrefetch(grab, interval=self._screenshot_interval)
+
+    def screenshot_interval_set(self, task=None):
+        """
+        Args:
+            task (str): Use `{task}.ScreenshotPace` if adaptive interval enabled,
+                such as battles that don't need to react within a few frames.
+        """
+        if self._screenshot_pacer is None:
+            return
+        if task is None:
+            self._screenshot_pacer.set_profile()
+        else:
+            self._screenshot_pacer.set_profile(
+                minimum=self.config.cross_get(keys=[task, 'ScreenshotPace', 'IntervalMin'], default=None),
+                maximum=self.config.cross_get(keys=[task, 'ScreenshotPace', 'IntervalMax'], default=None),
+            )
+
+    def screenshot_prefetch_stop(self):
+        if 'screenshot_prefetch' in self.__dict__:
+            self.screenshot_prefetch.stop()
 
     def screenshot(self):
         """
@@ -43,16 +247,28 @@ class Screenshot(ScreenshotMultiInheritance):
             np.ndarray:
         """
 
-        # 每次两次截图间隔时间
-        self._screenshot_interval.wait()
-        self._screenshot_interval.reset()
+        if self._screenshot_pacer is not None and self.control_timestamp > self.screenshot_timestamp:
+            self._screenshot_pacer.on_control(self.control_timestamp)
+
+        if self.config.Emulator_ScreenshotPrefetch:
+            # Freshest frame newer than the last screenshot and the last click
+            newer_than = max(self.screenshot_timestamp, self.control_timestamp)
+            self.screenshot_timestamp, self.image = self.screenshot_prefetch.get(newer_than=newer_than)
+        else:
+            # 每次两次截图间隔时间
+            self._screenshot_interval.wait()
+            self._screenshot_interval.reset()
 
-        method = self.screenshot_methods.get(self.config.Emulator_ScreenshotMethod)
-        self.image = method()
+            self.screenshot_timestamp = time.time()
+            method = self.screenshot_methods.get(self.config.Emulator_ScreenshotMethod)
+            self.image = method()
 
         self.image = self._handle_orientated_image(self.image)
+        frame_id = Frame.update(self.image)
+        if self._screenshot_pacer is not None:
+            self._screenshot_pacer.on_frame(frame_id)
 
-        self.screenshot_deque.append({"time": datetime.now(), "image": self.image})
+        self.screenshot_deque.append({"time": datetime.now(), "image": self.image}, tiles=Frame.tiles)
 
         return self.image
 
@@ -0,0 +1,102 @@
+from module.ocr.models import OCR_MODEL
+
+
+class OcrFuture:
+    def __init__(self, batch=None):
+        """
+        Result of a single line OCR request, available after its batch is flushed.
+
+        Args:
+            batch (OcrBatch):
+        """
+        self.batch = batch
+        self._done = False
+        self._value = None
+        self._func = None
+        self._parents = ()
+
+    @classmethod
+    def resolved(cls, value):
+        future = cls()
+        future.set_result(value)
+        return future
+
+    @classmethod
+    def gather(cls, futures, func):
+        """
+        Args:
+            futures (list[OcrFuture]):
+            func (callable): Receives a list of results of `futures`, returns the result of the new future.
+
+        Returns:
+            OcrFuture:
+        """
+        future = cls()
+        future._parents = tuple(futures)
+        future._func = func
+        return future
+
+    def done(self):
+        return self._done
+
+    def set_result(self, value):
+        self._value = value
+        self._done = True
+
+    def result(self):
+        """
+        Flush the batch if not yet.
+        """
+        if not self._done:
+            if self._func is not None:
+                self.set_result(self._func([future.result() for future in self._parents]))
+            else:
+                self.batch.flush()
+        return self._value
+
+
+class OcrBatch:
+    """
+    Collect single line OCR requests of a frame, from multiple Ocr objects and ad-hoc crops,
+    then run one batched forward per model.
+
+    Examples:
+        with OcrBatch() as batch:
+            power = [batch.submit('arena', image) for image in images]
+            own = OWN_POWER.ocr_async(self.device.image, batch=batch)
+        power = [future.result() for future in power]
+    """
+
+    def __init__(self):
+        # model -> list[tuple[np.ndarray, OcrFuture]]
+        self.requests = {}
+
+    def __len__(self):
+        return sum(len(requests) for requests in self.requests.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def submit(self, model, image):
+        """
+        Args:
+            model (str): Attribute name of OCR_MODEL, such as 'nikke'.
+            image (np.ndarray): Image of a single line.
+
+        Returns:
+            OcrFuture: Resolves to {'text': str, 'score': float}
+        """
+        future = OcrFuture(batch=self)
+        self.requests.setdefault(model, []).append((image, future))
+        return future
+
+    def flush(self):
+        requests, self.requests = self.requests, {}
+        for model, items in requests.items():
+            results = OCR_MODEL.ocr_single_lines(model, [image for image, _ in items])
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from module.logger import logger
+from module.ocr.batch import OcrFuture
+from module.ocr.letter_mask import LetterMask
+from module.ocr.telemetry import OCR_TELEMETRY
+
+
+class GlyphBank:
+    """
+    Glyph samples of a fixed game font, learnt from confident results of the OCR model.
+    Saved to ./assets/glyph/<font>.json by dev_tools/glyph_bank.py
+    """
+    FOLDER = './assets/glyph'
+    # Size of normalized glyphs, (width, height)
+    SIZE = (12, 16)
+    # Maximum samples of each character
+    MAX_SAMPLES = 5
+
+    # font -> GlyphBank, shared by all Ocr objects using the same font
+    _banks = {}
+    _banks_lock = threading.Lock()
+
+    def __init__(self, font):
+        self.font = font
+        self.chars = []
+        # Shape (n, width * height), float32 in 0 to 1
+        self.glyphs = np.empty((0, self.SIZE[0] * self.SIZE[1]), dtype=np.float32)
+        # Shape (n, 2), glyph height relative to line height, glyph width / height
+        self.shapes = np.empty((0, 2), dtype=np.float32)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls, font):
+        """
+        Args:
+            font (str):
+
+        Returns:
+            GlyphBank: Loaded from file if exists.
+        """
+        with cls._banks_lock:
+            bank = cls._banks.get(font)
+            if bank is None:
+                bank = cls(font)
+                bank.load()
+                cls._banks[font] = bank
+            return bank
+
+    @property
+    def file(self):
+        return os.path.join(self.FOLDER, f'{self.font}.json')
+
+    def __len__(self):
+        return len(self.chars)
+
+    def load(self):
+        if not os.path.exists(self.file):
+            logger.info(f'Glyph bank {self.font} not built, use OCR model only')
+            return
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if tuple(data['size']) != self.SIZE:
+                logger.warning(f'Glyph bank {self.font} has size {data["size"]}, ignored')
+                return
+            for sample in data['glyphs']:
+                glyph = np.array(sample['glyph'], dtype=np.float32) / 255
+                self.add(sample['char'], glyph, (sample['height'], sample['aspect']))
+        except Exception as e:
+            logger.warning(f'Failed to load glyph bank {self.font}: {e}')
+
+    def save(self):
+        os.makedirs(self.FOLDER, exist_ok=True)
+        glyphs = []
+        with self.lock:
+            for char, glyph, shape in zip(self.chars, self.glyphs, self.shapes):
+                glyphs.append({
+                    'char': char,
+                    'height': round(float(shape[0]), 3),
+                    'aspect': round(float(shape[1]), 3),
+                    'glyph': np.round(glyph * 255).astype(int).tolist(),
+                })
+        with open(self.file, 'w', encoding='utf-8') as f:
+            json.dump({'size': list(self.SIZE), 'glyphs': glyphs}, f)
+        logger.info(f'Glyph bank {self.font} saved, {len(glyphs)} glyphs')
+
+    def add(self, char, glyph, shape):
+        """
+        Args:
+            char (str):
+            glyph (np.ndarray): Normalized glyph, shape (width * height,)
+            shape (tuple[float, float]): Relative height, aspect.
+
+        Returns:
+            bool: If added.
+        """
+        with self.lock:
+            if self.chars.count(char) >= self.MAX_SAMPLES:
+                return False
+            self.chars.append(char)
+            self.glyphs = np.vstack([self.glyphs, glyph.reshape(1, -1)])
+            self.shapes = np.vstack([self.shapes, np.array(shape, dtype=np.float32).reshape(1, 2)])
+            return True
+
+    def match(self, glyphs, shapes):
+        """
+        Args:
+            glyphs (np.ndarray): Shape (m, width * height)
+            shapes (np.ndarray): Shape (m, 2)
+
+        Returns:
+            list[str], np.ndarray, np.ndarray: Best characters, their similarity,
+                and similarity of the best different character.
+        """
+        with self.lock:
+            chars, bank, bank_shapes = self.chars, self.glyphs, self.shapes
+        if not chars:
+            return [], np.zeros(len(glyphs)), np.zeros(len(glyphs))
+
+        similarity = 1 - np.abs(glyphs[:, None, :] - bank[None, :, :]).mean(axis=2)
+        # Glyphs are resized to the same size, compare their original shapes separately
+        height = np.abs(shapes[:, None, 0] - bank_shapes[None, :, 0])
+        aspect = np.abs(np.log(shapes[:, None, 1] / bank_shapes[None, :, 1]))
+        similarity[(height > 0.2) | (aspect > 0.4)] = 0
+
+        best = np.argmax(similarity, axis=1)
+        result = [chars[index] for index in best]
+        score = similarity[np.arange(len(glyphs)), best]
+        second = np.zeros(len(glyphs))
+        for row, char in enumerate(result):
+            others = [s for c, s in zip(chars, similarity[row]) if c != char]
+            if others:
+                second[row] = max(others)
+        return result, score, second
+
+
+class GlyphReader:
+    # Minimum pixels of a glyph, smaller components are noise
+    MIN_AREA = 3
+    # Minimum similarity of every glyph to accept a reading
+    THRESHOLD = 0.85
+    # Minimum similarity difference to the best different character
+    MARGIN = 0.05
+    # Minimum score of OCR model results to learn from
+    LEARN_SCORE = 0.9
+
+    def __init__(self, font, letter=(255, 255, 255), threshold=128, alphabet=None, learn=False):
+        """
+        Read text of a fixed font by segmenting glyphs with connected components and
+        matching them against a GlyphBank. Lines that can't be read confidently fall back
+        to the OCR model.
+
+        Args:
+            font (str): Name of the glyph bank, prebuilt by dev_tools/glyph_bank.py
+            letter (tuple(int)): Letter RGB.
+            threshold (int):
+            alphabet (str): Characters to learn, None to learn all.
+            learn (bool): Learn confident results of the OCR model into the bank at runtime.
+                Results are not verified, a wrong one affects all later reads of this font.
+        """
+        self.bank = GlyphBank.get(font)
+        self.letter_mask = LetterMask(letter=letter, threshold=threshold, pad=None)
+        self.alphabet = alphabet
+        self.learning = learn
+
+    def segment(self, image):
+        """
+        Args:
+            image (np.ndarray): Image of a single line.
+
+        Returns:
+            np.ndarray, np.ndarray: Normalized glyphs in shape (m, width * height) from left to right,
+                and their shapes in (m, 2).
+        """
+        mask = self.letter_mask.mask(image)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        boxes = [stats[index, :4] for index in range(1, count) if stats[index, 4] >= self.MIN_AREA]
+        boxes.sort(key=lambda box: box[0])
+
+        # Merge components overlapping horizontally, which are parts of one glyph
+        merged = []
+        for x, y, w, h in boxes:
+            if merged:
+                px1, py1, px2, py2 = merged[-1]
+                if x < px2 and min(x + w, px2) - x >= min(w, px2 - px1) / 2:
+                    merged[-1] = (px1, min(py1, y), max(px2, x + w), max(py2, y + h))
+                    continue
+            merged.append((x, y, x + w, y + h))
+        if not merged:
+            return np.empty((0, self.bank.glyphs.shape[1]), dtype=np.float32), np.empty((0, 2), dtype=np.float32)
+
+        line_height = max(y2 for _, _, _, y2 in merged) - min(y1 for _, y1, _, _ in merged)
+        glyphs, shapes = [], []
+        for x1, y1, x2, y2 in merged:
+            glyph = cv2.resize(mask[y1:y2, x1:x2], GlyphBank.SIZE, interpolation=cv2.INTER_AREA)
+            glyphs.append(glyph.ravel().astype(np.float32) / 255)
+            shapes.append(((y2 - y1) / line_height, (x2 - x1) / (y2 - y1)))
+        return np.array(glyphs), np.array(shapes, dtype=np.float32)
+
+    def read(self, image):
+        """
+        Args:
+            image (np.ndarray): Image of a single line.
+
+        Returns:
+            dict: {'text': str, 'score': float}, or None if not confident.
+        """
+        result = self._read(image)
+        OCR_TELEMETRY.inc('glyph', font=self.bank.font, result='fallback' if result is None else 'hit')
+        return result
+
+    def _read(self, image):
+        if not len(self.bank):
+            return None
+        glyphs, shapes = self.segment(image)
+        if not len(glyphs):
+            return None
+        chars, score, second = self.bank.match(glyphs, shapes)
+        if score.min() < self.THRESHOLD or (score - second).min() < self.MARGIN:
+            return None
+        return {'text': ''.join(chars), 'score': float(score.min())}
+
+    def learn(self, image, result):
+        """
+        Args:
+            image (np.ndarray): Image of a single line.
+            result (dict): {'text': str, 'score': float} of the OCR model on this image.
+
+        Returns:
+            int: Amount of glyphs learnt.
+        """
+        text = ''.join(result.get('text', ''))
+        if float(result.get('score', 0)) < self.LEARN_SCORE or not text:
+            return 0
+        if self.alphabet is not None and any(char not in self.alphabet for char in text):
+            return 0
+        glyphs, shapes = self.segment(image)
+        if len(glyphs) != len(text):
+            return 0
+        chars, score, _ = self.bank.match(glyphs, shapes)
+        learnt = 0
+        for index, char in enumerate(text):
+            # Skip glyphs the bank already recognizes
+            if chars and chars[index] == char and score[index] >= self.THRESHOLD:
+                continue
+            learnt += self.bank.add(char, glyphs[index], shapes[index])
+        return learnt
+
+    def submit(self, batch, model, image):
+        """
+        Args:
+            batch (OcrBatch):
+            model (str): OCR model to fallback.
+            image (np.ndarray): Image of a single line.
+
+        Returns:
+            OcrFuture: Resolves to {'text': str, 'score': float}
+        """
+        result = self.read(image)
+        if result is not None:
+            return OcrFuture.resolved(result)
+        if not self.learning:
+            return batch.submit(model, image)
+
+        def learn(results):
+            self.learn(image, results[0])
+            return results[0]
+
+        return OcrFuture.gather([batch.submit(model, image)], learn)
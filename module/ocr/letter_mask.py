@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+
+from module.base.utils import crop
+
+
+class LetterMask:
+    def __init__(self, letter=(255, 255, 255), threshold=128, pad=(-2, -2, 3, 2)):
+        """
+        Preprocessing stage that crops OCR areas tightly around letters of a given color.
+        Same as crop -> extract_letters() < 128 -> find_letter_area() -> crop, but runs
+        crops of the same shape in one pass on reused buffers.
+
+        Args:
+            letter (tuple(int)): Letter RGB.
+            threshold (int): Same as extract_letters()
+            pad (tuple(int)): Offset added to the letter area, (upper_left_x, upper_left_y, bottom_right_x, bottom_right_y).
+                None to return the mask area without tightening.
+        """
+        self.letter = tuple(letter)
+        self.threshold = threshold
+        self.pad = pad
+        # extract_letters() < 128 is monotonic in color distance, so it equals distance < cutoff
+        distance = np.arange(256, dtype=np.uint8)
+        is_letter = cv2.multiply(distance, 255.0 / threshold).ravel() < 128
+        self._cutoff = int(np.argmin(is_letter)) if not is_letter.all() else 256
+        self._subtrahend = (*letter, 0)
+        # Buffers reused across calls, grown on demand
+        self._stack = np.empty((0, 0, 3), dtype=np.uint8)
+        self._positive = np.empty((0, 0, 3), dtype=np.uint8)
+        self._negative = np.empty((0, 0, 3), dtype=np.uint8)
+
+    def _buffers(self, h, w):
+        if self._stack.shape[0] < h or self._stack.shape[1] < w:
+            shape = (max(h, self._stack.shape[0]), max(w, self._stack.shape[1]), 3)
+            self._stack = np.empty(shape, dtype=np.uint8)
+            self._positive = np.empty(shape, dtype=np.uint8)
+            self._negative = np.empty(shape, dtype=np.uint8)
+        # Contiguous views, so they can be used as cv2 dst
+        size = h * w * 3
+        return tuple(buffer.ravel()[:size].reshape(h, w, 3) for buffer in [self._stack, self._positive, self._negative])
+
+    def masks(self, images):
+        """
+        Args:
+            images (list[np.ndarray]): RGB images of the same shape (height, width, 3).
+
+        Returns:
+            np.ndarray: Shape (n, height, width), 255 on letter pixels and 0 on background.
+                Same as extract_letters(image, letter, threshold) < 128 of each image.
+        """
+        h, w = images[0].shape[:2]
+        n = len(images)
+        if n == 1:
+            stack = images[0]
+            _, positive, negative = self._buffers(h, w)
+        else:
+            # Images are stacked vertically, so cv2 processes them in one call
+            stack, positive, negative = self._buffers(n * h, w)
+            for index, image in enumerate(images):
+                stack[index * h:(index + 1) * h] = image
+        cv2.subtract(stack, self._subtrahend, dst=positive)
+        cv2.subtract(self._subtrahend, stack, dst=negative)
+        # Max of channels, reusing channel planes as dst
+        r, g, b = cv2.split(positive)
+        positive = cv2.max(cv2.max(r, g, dst=r), b, dst=r)
+        r, g, b = cv2.split(negative)
+        negative = cv2.max(cv2.max(r, g, dst=r), b, dst=r)
+        distance = cv2.add(positive, negative, dst=positive)
+        return cv2.compare(distance, self._cutoff, cv2.CMP_LT).reshape(n, h, w)
+
+    def mask(self, image):
+        """
+        Args:
+            image (np.ndarray): Shape (height, width, 3)
+
+        Returns:
+            np.ndarray: Shape (height, width), 255 on letter pixels and 0 on background.
+        """
+        return self.masks([image])[0]
+
+    @staticmethod
+    def letter_area(mask):
+        """
+        Args:
+            mask (np.ndarray): Shape (height, width), uint8
+
+        Returns:
+            tuple: (upper_left_x, upper_left_y, bottom_right_x, bottom_right_y), same as find_letter_area().
+                None if no letter.
+        """
+        x, y, w, h = cv2.boundingRect(mask)
+        if not w:
+            return None
+        return x, y, x + w - 1, y + h - 1
+
+    def tight(self, images):
+        """
+        Args:
+            images (list[np.ndarray]): RGB images in any shapes.
+
+        Returns:
+            list[np.ndarray]: Images cropped to letter area plus pad.
+                Images without letters are returned as a copy.
+        """
+        result = [None] * len(images)
+        groups = {}
+        for index, image in enumerate(images):
+            groups.setdefault(image.shape, []).append(index)
+        for shape, indexes in groups.items():
+            if not shape[0] or not shape[1]:
+                for index in indexes:
+                    result[index] = images[index].copy()
+                continue
+            masks = self.masks([images[index] for index in indexes])
+            for index, mask in zip(indexes, masks):
+                image = images[index]
+                area = self.letter_area(mask)
+                if area is None:
+                    result[index] = image.copy()
+                elif self.pad is None:
+                    result[index] = crop(image, (area[0], area[1], area[2] + 1, area[3] + 1))
+                else:
+                    result[index] = crop(image, [a + p for a, p in zip(area, self.pad)])
+        return result
+
+    def crop(self, image, areas):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+            areas (list[tuple]): OCR areas.
+
+        Returns:
+            list[np.ndarray]: Same as tight([crop(image, area) for area in areas]),
+                but areas inside the image are not copied before tightening.
+        """
+        h, w = image.shape[:2]
+        images = []
+        for area in areas:
+            x1, y1, x2, y2 = map(int, map(round, area))
+            if 0 <= x1 <= x2 <= w and 0 <= y1 <= y2 <= h:
+                images.append(image[y1:y2, x1:x2])
+            else:
+                images.append(crop(image, (x1, y1, x2, y2)))
+        return self.tight(images)
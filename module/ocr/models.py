@@ -1,11 +1,68 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from functools import cached_property
 
 import numpy as np
 
-from module.ocr.nikke_ocr import NikkeOcr
+from module.base.decorator import del_cached_property
+from module.base.frame import Frame
+from module.base.utils import float2str
+from module.logger import logger
+from module.ocr.telemetry import OCR_TELEMETRY
+from module.ocr.text_index import TextIndex
+
+
+class OcrResult(list):
+    """
+    Result of OcrModel.ocr(), a list of lines with a lazy text index shared by all lookups on it.
+    """
+
+    @cached_property
+    def text_index(self):
+        return TextIndex(self)
 
 
 class OcrModel:
+    # Amount of full OCR results to keep
+    OCR_CACHE_SIZE = 32
+    # Maximum single lines in one forward
+    BATCH_SIZE = 32
+    # Recognition models, attribute name -> NikkeOcr arguments
+    MODELS = {
+        'nikke': dict(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/nikke',
+                      model_name='/t25.ckpt', name='nikke'),
+        'arena': dict(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/nikke',
+                      model_name='/t27.ckpt', name='arena'),
+        'cnocr': dict(rec_model_name='densenet_lite_136-fc', root='./bin/cnocr_models/cnocr',
+                      model_name='/cnocr-v2.2-densenet_lite_136-fc.ckpt', name='cnocr'),
+        'cnocr_gru': dict(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/cnocr',
+                          model_name='/cnocr-v2.2-densenet_lite_136-gru.ckpt', name='cnocr'),
+    }
+    # Recognition backend of each model, 'pytorch', 'onnx' or 'onnx_int8'. Models not listed use pytorch.
+    # ONNX models need to be exported first: python -m dev_tools.ocr_onnx export
+    # Set from Optimization.OcrBackend by set_backend()
+    BACKEND = {}
+    # Intra-op threads of onnxruntime, 0 to let onnxruntime decide
+    ONNX_THREADS = 0
+    # Models used by each task, models of '*' are used by popup and login handlers in all tasks
+    TASK_MODELS = {
+        '*': ['cnocr'],
+        'RookieArena': ['arena'],
+        'RubbishShop': ['cnocr'],
+    }
+
+    def __init__(self):
+        # (model, fingerprint, area) -> list[dict]
+        self._ocr_cache = OrderedDict()
+        # OcrClient if models are proxied to the shared OCR server
+        self.client = None
+        # name -> loaded model, guarded by per-model locks so preload and tasks never load twice
+        self._models = {}
+        self._locks = {name: threading.Lock() for name in self.MODELS}
+        self._preload_thread = None
+
     @cached_property
     def nikke(self):
         """
@@ -21,8 +78,7 @@ class OcrModel:
             epochs: 15
             mainly used for the rookie arena
         """
-        return NikkeOcr(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/nikke',
-                        model_name='/t25.ckpt', name='nikke')
+        return self.get('nikke')
 
     @cached_property
     def arena(self):
@@ -33,8 +89,7 @@ class OcrModel:
             epochs: 15
             mainly used for the rookie arena
         """
-        return NikkeOcr(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/nikke',
-                        model_name='/t27.ckpt', name='arena')
+        return self.get('arena')
 
     # @cached_property
     # def nikke_digit(self):
@@ -47,30 +102,269 @@ class OcrModel:
     #                     model_name='/t23.ckpt', name='nikke_counter', cand_alphabet='0123456789/IDS'
     @cached_property
     def cnocr(self):
-        return NikkeOcr(rec_model_name='densenet_lite_136-fc', root='./bin/cnocr_models/cnocr',
-                        model_name='/cnocr-v2.2-densenet_lite_136-fc.ckpt', name='cnocr')
+        return self.get('cnocr')
 
     @cached_property
     def cnocr_gru(self):
-        return NikkeOcr(rec_model_name='densenet_lite_136-gru', root='./bin/cnocr_models/cnocr',
-                        model_name='/cnocr-v2.2-densenet_lite_136-gru.ckpt', name='cnocr')
+        return self.get('cnocr_gru')
+
+    def get(self, name):
+        """
+        Thread safe lazy loading.
+
+        Args:
+            name (str): Key of MODELS.
+
+        Returns:
+            NikkeOcr:
+        """
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                model = self.load(name)
+                self._models[name] = model
+            return model
+
+    def is_ready(self, name):
+        return name in self._models
+
+    @classmethod
+    def task_models(cls, tasks):
+        """
+        Args:
+            tasks (list[str]): Such as ['Reward', 'RookieArena']
+
+        Returns:
+            list[str]: Models used by these tasks.
+        """
+        models = []
+        for task in ['*'] + list(tasks):
+            for name in cls.TASK_MODELS.get(task, []):
+                if name not in models:
+                    models.append(name)
+        return models
+
+    def preload(self, names):
+        """
+        Load models in a background thread, so the first OCR in tasks doesn't stall.
+
+        Args:
+            names (list[str]): Keys of MODELS.
+        """
+        names = [name for name in names if not self.is_ready(name)]
+        if not names:
+            return
+
+        def run():
+            for name in names:
+                start_time = time.time()
+                try:
+                    self.__getattribute__(name)
+                except Exception as e:
+                    logger.warning(f'Failed to preload OCR model {name}: {e}')
+                    continue
+                logger.info(f'OCR model {name} preloaded ({float2str(time.time() - start_time)}s)')
+
+        logger.info(f'Preload OCR models: {names}')
+        self._preload_thread = threading.Thread(target=run, name='OcrPreload', daemon=True)
+        self._preload_thread.start()
+
+    def wait_preload(self, timeout=None):
+        """
+        Returns:
+            bool: If preload finished.
+        """
+        if self._preload_thread is not None:
+            self._preload_thread.join(timeout=timeout)
+            return not self._preload_thread.is_alive()
+        return True
+
+    def set_backend(self, backend, threads=0):
+        """
+        Select recognition backend of all models, models already loaded are not affected.
+
+        Args:
+            backend (str): 'pytorch', 'onnx' or 'onnx_int8'.
+            threads (int): Intra-op threads of onnxruntime, 0 to let onnxruntime decide.
+        """
+        self.BACKEND = {name: backend for name in self.MODELS}
+        self.ONNX_THREADS = threads
+
+    def load(self, name, backend=None):
+        """
+        Args:
+            name (str): Key of MODELS.
+            backend (str): Defaults to BACKEND[name] or 'pytorch'.
+
+        Returns:
+            NikkeOcr:
+        """
+        if self.client is not None:
+            from module.ocr.server import RemoteOcr
+            return RemoteOcr(name, client=self.client, fallback=self.fallback)
+        # cnocr and torch take seconds to import, import on first use
+        from module.ocr.nikke_ocr import NikkeOcr
+        if backend is None:
+            backend = self.BACKEND.get(name, 'pytorch')
+        return NikkeOcr(**self.MODELS[name], backend=backend, threads=self.ONNX_THREADS)
+
+    def use_server(self):
+        """
+        Proxy all models to the shared OCR server, start it if not running.
+        Fallback to local models if server unavailable.
+
+        Returns:
+            bool: If using server.
+        """
+        from module.ocr.server import OcrClient
+        # Backend of the first instance starting the server is used by all instances
+        client = OcrClient(backend=self.BACKEND, threads=self.ONNX_THREADS)
+        try:
+            client.connect()
+        except ConnectionError as e:
+            logger.warning(f'{e}, use local OCR models')
+            return False
+        self.client = client
+        for name in self.MODELS:
+            with self._locks[name]:
+                self._models.pop(name, None)
+                del_cached_property(self, name)
+        logger.info('OCR models are proxied to OCR server')
+        return True
+
+    def use_local(self):
+        """
+        Stop proxying models to the OCR server, such as server not responding.
+        """
+        client, self.client = self.client, None
+        if client is None:
+            return
+        client.close()
+        for name in self.MODELS:
+            with self._locks[name]:
+                self._models.pop(name, None)
+                del_cached_property(self, name)
+        logger.info('OCR models are local')
+
+    def fallback(self, name):
+        """
+        Args:
+            name (str): Key of MODELS.
+
+        Returns:
+            NikkeOcr: Local model, used if OCR server unavailable.
+        """
+        self.use_local()
+        return self.get(name)
+
+    @staticmethod
+    def fingerprint(image):
+        """
+        Args:
+            image (np.ndarray):
+
+        Returns:
+            tuple: Identity of image content.
+                The latest screenshot reuses the fingerprint calculated in Frame.update().
+        """
+        if image is Frame.image and Frame.fingerprint is not None:
+            return 'frame', Frame.fingerprint, image.shape
+        return 'image', zlib.crc32(np.ascontiguousarray(image).data), image.shape
+
+    def ocr(self, model, image, area=None):
+        """
+        Detect and recognize all text in image with cache.
+        Results of the same model, image content and area are reused,
+        so multiple appear_text() on one frame only run detection once.
+
+        Args:
+            model (str): Such as 'cnocr'
+            image (np.ndarray):
+            area (tuple): Area to crop before OCR.
+
+        Returns:
+            OcrResult: Results of NikkeOcr.ocr(), don't modify it.
+        """
+        key = (model, self.fingerprint(image), tuple(area) if area else None)
+        result = self._ocr_cache.get(key)
+        if result is None:
+            OCR_TELEMETRY.inc('cache', model=model, result='miss')
+            start_time = time.perf_counter()
+            result = OcrResult(self.__getattribute__(model).ocr(image, area=area))
+            OCR_TELEMETRY.observe('forward', time.perf_counter() - start_time, model=model, method='ocr')
+            self._ocr_cache[key] = result
+            while len(self._ocr_cache) > self.OCR_CACHE_SIZE:
+                self._ocr_cache.popitem(last=False)
+        else:
+            OCR_TELEMETRY.inc('cache', model=model, result='hit')
+            self._ocr_cache.move_to_end(key)
+        return result
+
+    def ocr_single_lines(self, model, images):
+        """
+        Recognize single lines in batches.
+        cnocr resizes lines to the same height and pads them to the widest one in each batch,
+        so this costs one forward per BATCH_SIZE lines instead of one per line.
+
+        Args:
+            model (str): Such as 'nikke'
+            images (list[np.ndarray]):
+
+        Returns:
+            list[dict]: {'text': str, 'score': float} of each image.
+        """
+        if not images:
+            return []
+        start_time = time.perf_counter()
+        result = self.__getattribute__(model).ocr_for_single_lines(
+            images, batch_size=min(len(images), self.BATCH_SIZE))
+        OCR_TELEMETRY.observe('forward', time.perf_counter() - start_time, model=model, method='single_lines')
+        OCR_TELEMETRY.observe('batch', len(images), model=model)
+        return result
+
+    def ocr_cache_clear(self):
+        self._ocr_cache.clear()
+
+    @staticmethod
+    def text_index(result):
+        """
+        Args:
+            result (list[dict]): Result of NikkeOcr.ocr()
+
+        Returns:
+            TextIndex:
+        """
+        if isinstance(result, OcrResult):
+            return result.text_index
+        return TextIndex(result)
 
     def get_location(self, text, result):
+        """
+        Args:
+            text (str): Target text, target with '_' only matches the exact text.
+            result (list[dict]): Result of NikkeOcr.ocr()
+
+        Returns:
+            tuple[float, float]: Center of the most similar line, or None.
+        """
         if result:
-            merged_dict = {}
-            for dictionary in list(map(lambda x: {x['text']: x['position']}, result)):
-                merged_dict.update(dictionary)
+            return self.text_index(result).location(text, threshold=0.51)
 
-            r = None
-            _, text = self.get_similarity(list(map(lambda x: x['text'], result)), text, threshold=0.51)
+    def get_locations(self, texts, result):
+        """
+        Look up multiple targets in one OCR result.
 
-            if _:
-                r = [merged_dict[text]]
+        Args:
+            texts (list[str]):
+            result (list[dict]): Result of NikkeOcr.ocr()
 
-            if r:
-                upper_left, bottom_right = r[0][0], r[0][2]
-                x, y = (np.array(upper_left) + np.array(bottom_right)) / 2
-                return x, y
+        Returns:
+            dict: text -> center of the most similar line, or None.
+        """
+        if not result:
+            return {text: None for text in texts}
+        index = self.text_index(result)
+        return {text: index.location(text, threshold=0.51) for text in texts}
 
     def get_similarity(self, texts, target, threshold=0.49):
         import difflib
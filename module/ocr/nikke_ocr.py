@@ -1,28 +1,78 @@
+import os
 from pathlib import Path
-from typing import Union, List, Dict, Any, Tuple
+from typing import Union, List, Dict, Any, Tuple, TYPE_CHECKING
 
 import numpy as np
-import torch
 from PIL import Image
 from cnocr import CnOcr
 
 from module.base.utils import crop
+from module.logger import logger
+
+if TYPE_CHECKING:
+    import torch
+
+
+def onnx_model_file(model_fp, quantized=False):
+    """
+    Args:
+        model_fp (str): './bin/cnocr_models/nikke/t25.ckpt'
+        quantized (bool):
+
+    Returns:
+        str: './bin/cnocr_models/nikke/t25.onnx' or './bin/cnocr_models/nikke/t25.int8.onnx'
+    """
+    name = os.path.splitext(model_fp)[0]
+    return f'{name}.int8.onnx' if quantized else f'{name}.onnx'
 
 
 class NikkeOcr(CnOcr):
     def __init__(self, rec_model_name='densenet_lite_136-gru', det_model_name='ch_PP-OCRv3_det', cand_alphabet=None,
                  context='cpu',
                  root='./bin/cnocr_models/nikke',
-                 model_name='/t25.ckpt', **kwargs):
+                 model_name='/t25.ckpt', backend='pytorch', threads=0, **kwargs):
+        """
+        Args:
+            backend (str): Recognition backend, 'pytorch', 'onnx' or 'onnx_int8'.
+                ONNX models are exported by dev_tools/ocr_onnx.py next to the checkpoint,
+                fallback to pytorch if not exported.
+            threads (int): Intra-op threads of onnxruntime, 0 to let onnxruntime decide.
+        """
         model_fp = root + model_name
+        if backend in ['onnx', 'onnx_int8']:
+            onnx_fp = onnx_model_file(model_fp, quantized=backend == 'onnx_int8')
+            if os.path.exists(onnx_fp):
+                model_fp = onnx_fp
+            else:
+                logger.warning(f'{onnx_fp} not found, use pytorch backend. '
+                               f'Run `python -m dev_tools.ocr_onnx export` to export it')
+                backend = 'pytorch'
+        self.backend = backend
         super().__init__(rec_model_name=rec_model_name, det_model_name=det_model_name, rec_model_fp=model_fp,
                          cand_alphabet=cand_alphabet, context=context,
-                         rec_model_backend='pytorch',
+                         rec_model_backend='pytorch' if backend == 'pytorch' else 'onnx',
                          **kwargs)
+        if backend != 'pytorch' and threads:
+            self.set_onnx_threads(threads)
+
+    def set_onnx_threads(self, threads):
+        """
+        cnocr creates onnxruntime sessions with default options, re-create it with limited threads.
+
+        Args:
+            threads (int):
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.rec_model._model = onnxruntime.InferenceSession(
+            self.rec_model._model_fp, sess_options=options, providers=['CPUExecutionProvider'])
 
     def ocr(
             self,
-            img_fp: Union[str, Path, Image.Image, torch.Tensor, np.ndarray],
+            img_fp: Union[str, Path, Image.Image, "torch.Tensor", np.ndarray],
             rec_batch_size=1,
             return_cropped_image=False,
             area: Tuple = None,
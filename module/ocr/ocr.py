@@ -5,9 +5,13 @@ from typing import TYPE_CHECKING
 import numpy as np
 
 from module.base.button import Button
+from module.base.frame import Frame
 from module.base.utils import extract_letters, crop, float2str
 from module.logger import logger
+from module.ocr.batch import OcrBatch, OcrFuture
+from module.ocr.glyph import GlyphReader
 from module.ocr.models import OCR_MODEL
+from module.ocr.telemetry import OCR_TELEMETRY
 
 if TYPE_CHECKING:
     from module.ocr.nikke_ocr import NikkeOcr
@@ -16,7 +20,8 @@ if TYPE_CHECKING:
 class Ocr:
     SHOW_LOG = True
 
-    def __init__(self, buttons, lang='nikke', letter=(255, 255, 255), threshold=128, alphabet=None, name=None):
+    def __init__(self, buttons, lang='nikke', letter=(255, 255, 255), threshold=128, alphabet=None, name=None,
+                 letter_mask=None, glyph=None, glyph_learn=False):
         """
         Args:
             buttons (Button, tuple, list[Button], list[tuple]): OCR area.
@@ -25,6 +30,12 @@ class Ocr:
             threshold (int):
             alphabet: Alphabet white list.
             name (str):
+            letter_mask (LetterMask): Crop OCR areas tightly around letters before OCR.
+            glyph (str): Name of the glyph bank to read fixed fonts by glyph matching,
+                the OCR model is only used when glyph matching is not confident. None to always use the OCR model.
+                Banks are built by dev_tools/glyph_bank.py for one font and letter color, don't share them.
+                No bank is shipped yet, pass a font only after committing its bank to ./assets/glyph.
+            glyph_learn (bool): Learn confident results of the OCR model into the glyph bank at runtime.
         """
         self.name = str(buttons) if isinstance(buttons, Button) else name
         self._buttons = buttons
@@ -32,6 +43,11 @@ class Ocr:
         self.threshold = threshold
         self.alphabet = alphabet
         self.lang = lang
+        self.letter_mask = letter_mask
+        self.glyph = GlyphReader(glyph, letter=letter, threshold=threshold, alphabet=alphabet,
+                                 learn=glyph_learn) if glyph else None
+        # (frame_id, areas, result) of the last OCR on screenshot
+        self._frame_result = None
 
     @property
     def cnocr(self) -> "NikkeOcr":
@@ -47,6 +63,25 @@ class Ocr:
     @buttons.setter
     def buttons(self, value):
         self._buttons = value
+        self._frame_result = None
+
+    def frame_result(self, image):
+        """
+        Args:
+            image (np.ndarray): Screenshot.
+
+        Returns:
+            Result of the last OCR, if image is the latest screenshot and OCR areas didn't change since then.
+            Otherwise None.
+        """
+        if self._frame_result is None or Frame.get_frame_id(image) is None:
+            return None
+        frame_id, areas, result = self._frame_result
+        if areas != self.buttons:
+            return None
+        if any(Frame.area_changed(area, since=frame_id) for area in areas):
+            return None
+        return result
 
     def pre_process(self, image):
         """
@@ -70,6 +105,16 @@ class Ocr:
         """
         return result
 
+    def after_process_all(self, result):
+        """
+        Args:
+            result (str, list[str]): Results of after_process(), a list if there are multiple buttons.
+
+        Returns:
+            Result of ocr()
+        """
+        return result
+
     def ocr(self, image, direct_ocr=False):
         """
             Args:
@@ -79,26 +124,66 @@ class Ocr:
             Returns:
 
         """
+        return self.ocr_async(image, direct_ocr=direct_ocr).result()
+
+    def ocr_async(self, image, direct_ocr=False, batch=None):
+        """
+        Submit OCR requests to a batch, so that multiple Ocr objects and crops
+        run in one forward per model.
+
+            Args:
+                image (np.ndarray, list[np.ndarray]):
+                direct_ocr (bool): True to skip preprocess.
+                batch (OcrBatch): Batch to submit to, defaults to a new batch flushed on result().
+
+            Returns:
+                OcrFuture: Resolves to the same result as ocr().
+        """
         start_time = time.time()
 
+        if not direct_ocr:
+            cached = self.frame_result(image)
+            if cached is not None:
+                return OcrFuture.resolved(self.after_process_all(cached))
+
         if direct_ocr:
             # image_list = [self.pre_process() for i in image]
             image_list = [i for i in image]
+            if self.letter_mask is not None:
+                image_list = self.letter_mask.tight(image_list)
+        elif self.letter_mask is not None:
+            image_list = self.letter_mask.crop(image, self.buttons)
         else:
             # image_list = [self.pre_process(crop(image, area)) for area in self.buttons]
             image_list = [crop(image, area) for area in self.buttons]
 
-        result_list = self.cnocr.ocr_for_single_lines(image_list)
-        result_list = [''.join(result.get('text', None)) for result in result_list]
-        result_list = [self.after_process(result) for result in result_list]
+        if batch is None:
+            batch = OcrBatch()
+        if self.glyph is None:
+            futures = [batch.submit(self.lang, i) for i in image_list]
+        else:
+            futures = [self.glyph.submit(batch, self.lang, i) for i in image_list]
+        buttons = self.buttons
+        frame_id = None if direct_ocr else Frame.get_frame_id(image)
 
-        if len(self.buttons) == 1:
-            result_list = result_list[0]
-        if Ocr.SHOW_LOG:
-            logger.attr(name='%s %ss' % (self.name, float2str(time.time() - start_time)),
-                        text=str(result_list))
+        def finish(result_list):
+            for result in result_list:
+                OCR_TELEMETRY.observe('score', float(result.get('score', 0)), site=self.name, model=self.lang)
+            result_list = [''.join(result.get('text', None)) for result in result_list]
+            result_list = [self.after_process(result) for result in result_list]
 
-        return result_list
+            if len(buttons) == 1:
+                result_list = result_list[0]
+            if frame_id is not None:
+                self._frame_result = (frame_id, buttons, result_list)
+            OCR_TELEMETRY.observe('latency', time.time() - start_time, site=self.name, model=self.lang)
+            if Ocr.SHOW_LOG:
+                logger.attr(name='%s %ss' % (self.name, float2str(time.time() - start_time)),
+                            text=str(result_list))
+
+            return self.after_process_all(result_list)
+
+        return OcrFuture.gather(futures, finish)
 
 
 class Digit(Ocr):
@@ -108,8 +193,9 @@ class Digit(Ocr):
     """
 
     def __init__(self, buttons, lang='nikke', letter=(255, 255, 255), threshold=128, alphabet='0123456789IDS',
-                 name=None):
-        super().__init__(buttons, lang=lang, letter=letter, threshold=threshold, alphabet=alphabet, name=name)
+                 name=None, letter_mask=None, glyph=None, glyph_learn=False):
+        super().__init__(buttons, lang=lang, letter=letter, threshold=threshold, alphabet=alphabet, name=name,
+                         letter_mask=letter_mask, glyph=glyph, glyph_learn=glyph_learn)
 
     def after_process(self, result):
         result = super().after_process(result)
@@ -125,27 +211,26 @@ class Digit(Ocr):
 
 class DigitCounter(Ocr):
     def __init__(self, buttons, lang='nikke', letter=(255, 255, 255), threshold=128, alphabet='0123456789/IDS',
-                 name=None):
-        super().__init__(buttons, lang=lang, letter=letter, threshold=threshold, alphabet=alphabet, name=name)
+                 name=None, letter_mask=None, glyph=None, glyph_learn=False):
+        super().__init__(buttons, lang=lang, letter=letter, threshold=threshold, alphabet=alphabet, name=name,
+                         letter_mask=letter_mask, glyph=glyph, glyph_learn=glyph_learn)
 
     def after_process(self, result):
         result = super().after_process(result)
         result = result.replace('I', '1').replace('D', '0').replace('S', '5')
         return result
 
-    def ocr(self, image, direct_ocr=False):
+    def after_process_all(self, result_list):
         """
         DigitCounter only support doing OCR on one button.
         Do OCR on a counter, such as `14/15`, and returns 14, 1, 15
 
         Args:
-            image:
-            direct_ocr:
+            result_list (str, list[str]):
 
         Returns:
             int, int, int: current, remain, total.
         """
-        result_list = super().ocr(image, direct_ocr=direct_ocr)
         result = result_list[0] if isinstance(result_list, list) else result_list
 
         result = re.search(r'(\d+)/(\d+)', result)
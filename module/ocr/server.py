@@ -0,0 +1,366 @@
+"""
+Shared OCR inference server.
+
+All NKAS instances on the same host send OCR requests to one server process,
+so models are loaded once per host instead of once per instance.
+Single line requests from different instances arriving within BATCH_WINDOW are run in one forward.
+Full OCR requests are run in another thread, so that slow text detection never holds back single lines.
+
+Run manually:
+    python -m module.ocr.server
+    python -m module.ocr.server --backend nikke:onnx --backend arena:onnx --threads 2
+Or enable Optimization.OcrServer and the first instance will start it in background.
+"""
+import argparse
+import getpass
+import os
+import queue
+import secrets
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from filelock import FileLock, Timeout
+
+from module.logger import logger
+
+FAMILY = 'AF_PIPE' if os.name == 'nt' else 'AF_UNIX'
+AUTHKEY_SIZE = 32
+
+
+def runtime_dir():
+    """
+    Returns:
+        str: Folder of current user holding socket, lock and authkey of the OCR server,
+            only accessible by current user.
+
+    Raises:
+        ConnectionError: If folder is owned by another user.
+    """
+    if os.name == 'nt':
+        # Under user profile, which is not accessible by other users
+        folder = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'nkas')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        folder = os.path.join(base, 'nkas')
+    else:
+        folder = os.path.join(tempfile.gettempdir(), f'nkas-{os.getuid()}')
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    # lstat, so a symlink planted by others is not followed
+    info = os.lstat(folder)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise ConnectionError(f'OCR server folder {folder} is not owned by current user')
+    if info.st_mode & 0o077:
+        os.chmod(folder, 0o700)
+    return folder
+
+
+def server_address():
+    if os.name == 'nt':
+        # Pipes are global, access is guarded by authkey
+        return rf'\\.\pipe\nkas_ocr_{getpass.getuser()}'
+    return os.path.join(runtime_dir(), 'ocr.sock')
+
+
+def server_lock():
+    return os.path.join(runtime_dir(), 'ocr.lock')
+
+
+def server_authkey():
+    """
+    Random key shared by server and clients of current user, created on first use.
+
+    Returns:
+        bytes:
+    """
+    file = os.path.join(runtime_dir(), 'ocr.key')
+    try:
+        fd = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # May be being written by another process
+        for _ in range(10):
+            with open(file, 'rb') as f:
+                key = f.read()
+            if len(key) >= AUTHKEY_SIZE:
+                return key
+            time.sleep(0.1)
+        raise ConnectionError(f'Invalid OCR server authkey {file}')
+    key = secrets.token_bytes(AUTHKEY_SIZE)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+class OcrServer:
+    # Seconds to wait for more single line requests of the same model
+    BATCH_WINDOW = 0.01
+    # Exit after no client connected for seconds
+    IDLE_TIMEOUT = 600
+
+    def __init__(self, backend=None, threads=0):
+        """
+        Args:
+            backend (dict[str, str]): Recognition backend of each model, see OcrModel.BACKEND.
+            threads (int): Intra-op threads of onnxruntime, 0 to let onnxruntime decide.
+        """
+        from module.ocr.models import OcrModel
+        self.models = OcrModel()
+        if backend:
+            self.models.BACKEND = dict(backend)
+        self.models.ONNX_THREADS = threads
+        # tuple[method, model, args, kwargs, reply]
+        # Single line requests, batched by worker()
+        self.requests = queue.Queue()
+        # Other requests, such as full OCR with text detection, run one by one by detector()
+        self.detections = queue.Queue()
+        self.clients = 0
+        self.idle_since = time.time()
+        self.lock = threading.Lock()
+
+    def run(self):
+        lock = FileLock(server_lock())
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            logger.info('OCR server is already running')
+            return
+        address = server_address()
+        if FAMILY == 'AF_UNIX' and os.path.exists(address):
+            # Stale socket of a dead server
+            os.remove(address)
+
+        listener = Listener(address, family=FAMILY, authkey=server_authkey())
+        logger.info(f'OCR server listening on {address}')
+        threading.Thread(target=self.worker, daemon=True).start()
+        threading.Thread(target=self.detector, daemon=True).start()
+        threading.Thread(target=self.watchdog, daemon=True).start()
+        while 1:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f'OCR server accept error: {e}')
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def watchdog(self):
+        while 1:
+            time.sleep(10)
+            with self.lock:
+                if not self.clients and time.time() - self.idle_since > self.IDLE_TIMEOUT:
+                    logger.info('OCR server idle, exit')
+                    os._exit(0)
+
+    def serve(self, conn):
+        with self.lock:
+            self.clients += 1
+        try:
+            while 1:
+                try:
+                    method, model, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    break
+                reply = queue.Queue(maxsize=1)
+                if method == 'ocr_for_single_lines':
+                    self.requests.put((method, model, args, kwargs, reply))
+                else:
+                    self.detections.put((method, model, args, kwargs, reply))
+                status, result = reply.get()
+                try:
+                    conn.send((status, result))
+                except (EOFError, OSError):
+                    break
+                except Exception as e:
+                    # Result or exception not picklable
+                    conn.send(('error', RuntimeError(f'{type(result).__name__}: {result}; {e}')))
+        finally:
+            conn.close()
+            with self.lock:
+                self.clients -= 1
+                self.idle_since = time.time()
+
+    def worker(self):
+        while 1:
+            requests = [self.requests.get()]
+            # Collect single line requests from other clients
+            deadline = time.time() + self.BATCH_WINDOW
+            while 1:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            batches = {}
+            for request in requests:
+                batches.setdefault(request[1], []).append(request)
+
+            for model, batch in batches.items():
+                images = [image for request in batch for image in request[2][0]]
+                try:
+                    results = self.models.ocr_single_lines(model, images)
+                except Exception as e:
+                    for request in batch:
+                        request[4].put(('error', e))
+                    continue
+                for request in batch:
+                    count = len(request[2][0])
+                    request[4].put(('ok', results[:count]))
+                    results = results[count:]
+
+    def detector(self):
+        while 1:
+            method, model, args, kwargs, reply = self.detections.get()
+            self.call(reply, model, method, *args, **kwargs)
+
+    def call(self, reply, model, method, *args, **kwargs):
+        # Model is loaded here, so loading errors are sent to client as well
+        try:
+            func = getattr(self.models.__getattribute__(model), method)
+            reply.put(('ok', func(*args, **kwargs)))
+        except Exception as e:
+            reply.put(('error', e))
+
+
+class OcrClient:
+    # Seconds to wait for a starting server
+    CONNECT_TIMEOUT = 30
+    # Seconds to wait for a reply, including model loading in server
+    REQUEST_TIMEOUT = 60
+
+    def __init__(self, backend=None, threads=0):
+        """
+        Args:
+            backend (dict[str, str]): Recognition backend of each model, used if server is started by this client.
+            threads (int): Intra-op threads of onnxruntime, used if server is started by this client.
+        """
+        self.backend = backend or {}
+        self.threads = threads
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        self.conn = Client(server_address(), family=FAMILY, authkey=server_authkey())
+
+    def connect(self):
+        """
+        Connect to server, start one in background if not running.
+
+        Raises:
+            ConnectionError: If server unavailable.
+        """
+        try:
+            self._connect()
+            return
+        except (OSError, EOFError):
+            pass
+
+        logger.info('Start OCR server')
+        args = [f'--backend={name}:{backend}' for name, backend in self.backend.items()]
+        args.append(f'--threads={self.threads}')
+        subprocess.Popen([sys.executable, '-m', 'module.ocr.server', *args], cwd=os.getcwd(),
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=os.name != 'nt')
+        deadline = time.time() + self.CONNECT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(0.5)
+            try:
+                self._connect()
+                return
+            except (OSError, EOFError):
+                continue
+        raise ConnectionError(f'Unable to connect to OCR server at {server_address()}')
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def _request(self, request):
+        self.conn.send(request)
+        if not self.conn.poll(self.REQUEST_TIMEOUT):
+            # Late reply would be received by the next request, drop this connection
+            self.conn.close()
+            self.conn = None
+            raise ConnectionError(f'OCR server not responding in {self.REQUEST_TIMEOUT}s')
+        return self.conn.recv()
+
+    def request(self, method, model, *args, **kwargs):
+        """
+        Raises:
+            ConnectionError: If server unavailable or not responding.
+        """
+        with self.lock:
+            if self.conn is None:
+                self.connect()
+            try:
+                status, result = self._request((method, model, args, kwargs))
+            except ConnectionError:
+                raise
+            except (OSError, EOFError):
+                # Server restarted, retry once
+                self.conn = None
+                self.connect()
+                try:
+                    status, result = self._request((method, model, args, kwargs))
+                except ConnectionError:
+                    raise
+                except (OSError, EOFError) as e:
+                    self.conn = None
+                    raise ConnectionError(f'OCR server connection lost: {e}')
+        if status == 'error':
+            raise result
+        return result
+
+
+class RemoteOcr:
+    def __init__(self, name, client, fallback):
+        """
+        Proxy of a NikkeOcr model in the OCR server.
+
+        Args:
+            name (str): Key of OcrModel.MODELS
+            client (OcrClient):
+            fallback (callable): Receives name and returns the local NikkeOcr model,
+                used if server unavailable.
+        """
+        self.name = name
+        self.client = client
+        self.fallback = fallback
+
+    def ocr(self, img_fp, rec_batch_size=1, return_cropped_image=False, area=None, **det_kwargs):
+        from module.base.utils import crop
+        if area:
+            img_fp = crop(img_fp, area)
+        try:
+            return self.client.request('ocr', self.name, img_fp, rec_batch_size, return_cropped_image, **det_kwargs)
+        except ConnectionError as e:
+            logger.warning(f'{e}, use local OCR models')
+        return self.fallback(self.name).ocr(img_fp, rec_batch_size, return_cropped_image, **det_kwargs)
+
+    def ocr_for_single_lines(self, img_list, batch_size=1, return_cropped_image=False):
+        img_list = list(img_list)
+        try:
+            return self.client.request('ocr_for_single_lines', self.name, img_list)
+        except ConnectionError as e:
+            logger.warning(f'{e}, use local OCR models')
+        return self.fallback(self.name).ocr_for_single_lines(
+            img_list, batch_size=batch_size, return_cropped_image=return_cropped_image)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared OCR inference server')
+    parser.add_argument('--backend', action='append', default=[],
+                        help='Recognition backend of a model, such as nikke:onnx')
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads of onnxruntime')
+    args = parser.parse_args()
+    OcrServer(backend=dict(item.split(':', 1) for item in args.backend), threads=args.threads).run()
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+
+from module.logger import logger
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SCORE_BUCKETS = (0.1, 0.3, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        """
+        Args:
+            buckets (tuple): Upper bounds, ascending, +Inf is implicit.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """
+        Returns:
+            list[tuple[str, int]]: (upper bound, observations less or equal to it), ends with '+Inf'.
+        """
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(bounds, accumulate(self.counts)))
+
+
+class OcrTelemetry:
+    """
+    Aggregated OCR metrics of this process, labelled by the running task and call site.
+
+    Examples:
+        OCR_TELEMETRY.show(task='RookieArena')
+        OCR_TELEMETRY.dump('./log/ocr/nkas')  # ./log/ocr/nkas.json and ./log/ocr/nkas.prom
+    """
+    # key -> (metric name, type, labels, buckets, help)
+    METRICS = {
+        'latency': ('nkas_ocr_latency_seconds', 'histogram', ('task', 'site', 'model'), LATENCY_BUCKETS,
+                    'Wall time of OCR calls, from request to parsed result'),
+        'score': ('nkas_ocr_score', 'histogram', ('task', 'site', 'model'), SCORE_BUCKETS,
+                  'Recognition confidence of each line'),
+        'forward': ('nkas_ocr_forward_seconds', 'histogram', ('task', 'model', 'method'), LATENCY_BUCKETS,
+                    'Wall time of OCR model calls'),
+        'batch': ('nkas_ocr_batch_size', 'histogram', ('task', 'model'), BATCH_BUCKETS,
+                  'Single lines in one recognition call'),
+        'cache': ('nkas_ocr_cache_total', 'counter', ('task', 'model', 'result'), None,
+                  'OCR result cache lookups'),
+        'glyph': ('nkas_ocr_glyph_total', 'counter', ('task', 'font', 'result'), None,
+                  'Glyph matching reads, hit or fallback to OCR model'),
+    }
+
+    def __init__(self):
+        self.task = ''
+        # key -> {label values: Histogram or float}
+        self.series = {key: {} for key in self.METRICS}
+        self.lock = threading.Lock()
+
+    def _labels(self, key, labels):
+        names = self.METRICS[key][2]
+        labels.setdefault('task', self.task)
+        return tuple(str(labels.get(name, '')) for name in names)
+
+    def observe(self, key, value, **labels):
+        """
+        Args:
+            key (str): Key of METRICS, a histogram.
+            value (float):
+            **labels: Labels of the metric, task defaults to the running task.
+        """
+        labels = self._labels(key, labels)
+        with self.lock:
+            series = self.series[key]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.METRICS[key][3])
+            histogram.observe(value)
+
+    def inc(self, key, value=1, **labels):
+        """
+        Args:
+            key (str): Key of METRICS, a counter.
+            value (float):
+            **labels:
+        """
+        labels = self._labels(key, labels)
+        with self.lock:
+            series = self.series[key]
+            series[labels] = series.get(labels, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.series = {key: {} for key in self.METRICS}
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: metric name -> {'type': str, 'help': str, 'series': list[dict]}
+        """
+        result = {}
+        with self.lock:
+            for key, (name, kind, label_names, _, help_) in self.METRICS.items():
+                series = []
+                for labels, value in self.series[key].items():
+                    row = {'labels': dict(zip(label_names, labels))}
+                    if kind == 'histogram':
+                        row.update(count=value.count, sum=value.sum, buckets=dict(value.cumulative()))
+                    else:
+                        row['value'] = value
+                    series.append(row)
+                result[name] = {'type': kind, 'help': help_, 'series': series}
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """
+        Returns:
+            str: Prometheus text exposition format.
+        """
+
+        def escape(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        def format_labels(labels, **extra):
+            labels = {**labels, **extra}
+            return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+        lines = []
+        for name, metric in self.to_dict().items():
+            if not metric['series']:
+                continue
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            for row in metric['series']:
+                labels = row['labels']
+                if metric['type'] == 'histogram':
+                    for bound, count in row['buckets'].items():
+                        lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {row["sum"]}')
+                    lines.append(f'{name}_count{format_labels(labels)} {row["count"]}')
+                else:
+                    lines.append(f'{name}{format_labels(labels)} {row["value"]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file):
+        """
+        Args:
+            file (str): Path without extension, writes <file>.json and <file>.prom
+        """
+        folder = os.path.dirname(file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        try:
+            with open(f'{file}.json', 'w', encoding='utf-8') as f:
+                f.write(self.to_json())
+            with open(f'{file}.prom', 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+        except OSError as e:
+            logger.warning(f'Failed to dump OCR telemetry: {e}')
+
+    def show(self, task=None, limit=10):
+        """
+        Log OCR call sites that cost the most time.
+
+        Args:
+            task (str): Only show this task, None for all.
+            limit (int):
+        """
+        with self.lock:
+            rows = [(labels, histogram.count, histogram.sum) for labels, histogram in self.series['latency'].items()
+                    if task is None or labels[0] == task]
+        if not rows:
+            return
+        rows.sort(key=lambda row: -row[2])
+        logger.hr('OCR telemetry', level=2)
+        logger.info(f'{"total":>8} {"count":>6} {"mean":>8}  site')
+        for (row_task, site, model), count, total in rows[:limit]:
+            logger.info(f'{total:>8.3f} {count:>6} {total / count:>8.4f}  {site} ({model})')
+
+
+OCR_TELEMETRY = OcrTelemetry()
@@ -0,0 +1,100 @@
+from collections import Counter, defaultdict
+
+import numpy as np
+
+
+class TextIndex:
+    def __init__(self, result):
+        """
+        Character index of an OCR result, to look up target strings without scanning every line.
+
+        Similarity is the same as difflib.SequenceMatcher.quick_ratio(),
+        2 * (common characters) / (total characters), but only lines sharing a character
+        with the target are scored, and exact matches return directly.
+
+        Args:
+            result (list[dict]): Result of NikkeOcr.ocr(), [{'text': str, 'position': np.ndarray}, ...]
+        """
+        self.texts = []
+        self.counters = []
+        # text -> position, the last one if text duplicates
+        self.positions = {}
+        # character -> indexes of lines containing it
+        self.chars = defaultdict(list)
+        for index, line in enumerate(result):
+            text = line['text']
+            counter = Counter(text)
+            self.texts.append(text)
+            self.counters.append(counter)
+            self.positions[text] = line['position']
+            for char in counter:
+                self.chars[char].append(index)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def similarity(self, target):
+        """
+        Args:
+            target (str): Text to find. Target with '_' only matches lines equal to target.strip('_').
+
+        Returns:
+            float, str: Highest similarity and the matched text, 0 and '' if nothing shares a character.
+        """
+        counter = Counter(target)
+        if '_' in target:
+            text = target.strip('_')
+            if text not in self.positions:
+                return 0, ''
+            indexes = [self.texts.index(text)]
+        elif target in self.positions:
+            return 1., target
+        else:
+            indexes = sorted({index for char in counter for index in self.chars.get(char, [])})
+
+        max_ratio, most_matched = 0, ''
+        for index in indexes:
+            line = self.counters[index]
+            matches = sum(min(count, line[char]) for char, count in counter.items() if char in line)
+            ratio = 2. * matches / (len(target) + len(self.texts[index]))
+            if ratio > max_ratio:
+                max_ratio, most_matched = ratio, self.texts[index]
+        return max_ratio, most_matched
+
+    def match(self, target, threshold=0.51):
+        """
+        Args:
+            target (str):
+            threshold (float):
+
+        Returns:
+            float, str, np.ndarray: Similarity, matched text, position of the best line.
+                None if similarity below threshold.
+        """
+        ratio, text = self.similarity(target)
+        if not text or ratio < threshold:
+            return None
+        return ratio, text, self.positions[text]
+
+    def match_many(self, targets, threshold=0.51):
+        """
+        Args:
+            targets (list[str]):
+            threshold (float):
+
+        Returns:
+            dict: target -> result of match()
+        """
+        return {target: self.match(target, threshold=threshold) for target in targets}
+
+    def location(self, target, threshold=0.51):
+        """
+        Returns:
+            tuple[float, float]: Center of the best line, or None.
+        """
+        match = self.match(target, threshold=threshold)
+        if match is None:
+            return None
+        position = match[2]
+        x, y = (np.array(position[0]) + np.array(position[2])) / 2
+        return x, y
@@ -4,13 +4,12 @@ from functools import cached_property
 from module.base.timer import Timer
 from module.base.utils import (
     _area_offset,
-    crop,
-    extract_letters,
-    find_letter_area,
     float2str,
     point2str,
 )
 from module.logger import logger
+from module.ocr.batch import OcrBatch
+from module.ocr.letter_mask import LetterMask
 from module.ocr.ocr import Digit
 from module.rookie_arena.assets import *
 from module.ui.assets import ROOKIE_ARENA_CHECK, ARENA_GOTO_ROOKIE_ARENA
@@ -23,6 +22,8 @@ class RookieArenaIsUnavailable(Exception):
 
 
 class RookieArena(UI):
+    competitor_power_mask = LetterMask(letter=(90, 93, 99), threshold=128, pad=(-2, -2, 3, 2))
+
     @property
     def free_opportunity_remain(self) -> bool:
         result = FREE_OPPORTUNITY_CHECK.appear_on(self.device.image, 20)
@@ -43,25 +44,13 @@ class RookieArena(UI):
         r.sort(key=lambda x: x[1])
         r = [_area_offset(i, (22, -10, 65, 8)) for i in r]
 
-        r = [
-            self.ocr_models.__getattribute__("arena").ocr(
-                crop(
-                    crop(self.device.image, i),
-                    _area_offset(
-                        find_letter_area(
-                            extract_letters(
-                                crop(self.device.image, i), letter=(90, 93, 99)
-                            )
-                            < 128
-                        ),
-                        (-2, -2, 3, 2),
-                    ),
-                )
-            )
-            for i in r
-        ]
+        with OcrBatch() as batch:
+            r = [
+                batch.submit("arena", i)
+                for i in self.competitor_power_mask.crop(self.device.image, r)
+            ]
 
-        r = list(map(lambda x: int(x[0]["text"]), r))
+        r = list(map(lambda x: int("".join(x.result()["text"])), r))
         logger.attr(
             name="%s %ss"
                  % ("COMPETITOR_POWER_LIST", float2str(time.time() - start_time)),
@@ -225,7 +225,8 @@ class ShopBase(UI):
                         and i.button.match_appear_on(self.device.image, 15):
                     if click_timer.reached():
                         self.device.click(i.button)
-                        img = self.device.image
+                        # Screenshot buffers are reused, keep a copy
+                        img = self.device.image.copy()
                         self.p(i.button)
                         self.device.image = img
                         if i.timer.reached():
@@ -1,3 +1,4 @@
+from module.base.button import ButtonGroup
 from module.base.decorator import run_once
 from module.base.timer import Timer
 from module.exception import GameNotRunningError, GamePageUnknownError, GameStart
@@ -39,6 +40,20 @@ class UI(InfoHandler):
                 page_interception,
                 page_special_interception,
                 ]
+    _ui_page_group = None
+
+    @property
+    def ui_page_group(self):
+        """
+            Check buttons of all known pages, packed once and shared by all UI instances.
+
+            Returns:
+                list[Page], ButtonGroup:
+        """
+        if UI._ui_page_group is None:
+            pages = [page for page in self.ui_pages if page.check_button is not None]
+            UI._ui_page_group = (pages, ButtonGroup([page.check_button for page in pages], offset=(30, 30)))
+        return UI._ui_page_group
 
     def ui_page_appear(self, page: Page):
         """
@@ -47,6 +62,23 @@ class UI(InfoHandler):
         """
         return self.appear(page.check_button, offset=(30, 30))
 
+    def ui_page_detect(self):
+        """
+            Detect current page from the current screenshot in one pass.
+
+            Returns:
+                Page, dict[Page, float]: Matched page or None, and similarity of the verified pages.
+        """
+        pages, group = self.ui_page_group
+        for page in pages:
+            self.device.stuck_record_add(page.check_button)
+
+        index, scores = group.match(self.device.image, threshold=self.config.BUTTON_MATCH_SIMILARITY)
+        scores = {pages[i]: score for i, score in scores.items()}
+        if index is None:
+            return None, scores
+        return pages[index], scores
+
     def ui_get_current_page(self, skip_first_screenshot=True):
         logger.info("UI get current page")
 
@@ -75,13 +107,11 @@ class UI(InfoHandler):
                 break
 
             # Known pages
-            for page in self.ui_pages:
-                if page.check_button is None:
-                    continue
-                if self.ui_page_appear(page=page):
-                    logger.attr("UI", page.name)
-                    self.ui_current = page
-                    return page
+            page, _ = self.ui_page_detect()
+            if page is not None:
+                logger.attr("UI", page.name)
+                self.ui_current = page
+                return page
 
             # Unknown page but able to handle
             logger.info("Unknown ui page")
@@ -7,7 +7,6 @@ from typing import List, Dict, Union
 from filelock import FileLock
 from rich.console import ConsoleRenderable
 
-from main import NikkeAutoScript
 from module.config.utils import filepath_config
 from module.logger import set_file_logger, set_func_logger, logger
 from module.submodule.utils import mod_instance, get_config_mod
@@ -52,7 +51,9 @@ class ProcessManager:
         '''
 
         set_file_logger(name=config_name)
-        NikkeAutoScript(config_name=config_name).loop()
+        from main import NikkeAutoScript
+
+        NikkeAutoScript(config_name=config_name, stop_event=e).loop()
 
     def start(self, func, ev: threading.Event = None) -> None:
         if not self.alive:
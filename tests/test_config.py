@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+
+from module.config.config import NikkeConfig
+from module.config.utils import filepath_config
+
+CONFIG_NAME = 'pytest_write_behind'
+
+
+@pytest.fixture
+def config():
+    # module.logger changes cwd to repo root on import
+    file = filepath_config(CONFIG_NAME)
+    shutil.copy(filepath_config('template'), file)
+    yield NikkeConfig(CONFIG_NAME, task='Reward')
+    for path in [file, f'{file}.lock']:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_config():
+    with open(filepath_config(CONFIG_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def gui_write(key, value):
+    data = read_config()
+    task, group, arg = key.split('.')
+    data[task][group][arg] = value
+    # Make sure mtime changes on filesystems with coarse timestamps
+    stat = os.stat(filepath_config(CONFIG_NAME))
+    with open(filepath_config(CONFIG_NAME), 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.utime(filepath_config(CONFIG_NAME), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_write_behind_keeps_gui_write(config):
+    enable = read_config()['Daily']['Scheduler']['Enable']
+    config.write_behind = True
+    config.task_delay(minute=60)
+    assert config.dirty
+
+    gui_write('Daily.Scheduler.Enable', not enable)
+    config.write_behind = False
+    assert config.flush()
+
+    data = read_config()
+    assert data['Daily']['Scheduler']['Enable'] is (not enable)
+    assert data['Reward']['Scheduler']['NextRun'] == str(config.data['Reward']['Scheduler']['NextRun'])
+
+
+def test_write_behind_update_after_gui_write(config):
+    enable = read_config()['Daily']['Scheduler']['Enable']
+    config.write_behind = True
+    config.task_delay(minute=60)
+
+    gui_write('Daily.Scheduler.Enable', not enable)
+    config.task_call('Shop')
+    config.write_behind = False
+    config.flush()
+
+    data = read_config()
+    assert data['Daily']['Scheduler']['Enable'] is (not enable)
+    assert data['Shop']['Scheduler']['Enable'] is True
+    assert data['Reward']['Scheduler']['NextRun'] == str(config.data['Reward']['Scheduler']['NextRun'])
+
+
+def test_flush_skips_unchanged(config):
+    target = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    config.task_delay(target=target)
+    stat = os.stat(filepath_config(CONFIG_NAME)).st_mtime_ns
+    config.task_delay(target=target)
+    assert os.stat(filepath_config(CONFIG_NAME)).st_mtime_ns == stat